@@ -0,0 +1,67 @@
+'''
+Benchmark of the weekly bar charts rendered as three separate figures,
+each with its own layout pass and Agg canvas, against a single figure
+with three panels sharing the x-axis.
+
+Usage: python benchmarks/chart_layout.py [number of bars] [repeats]
+'''
+
+import sys
+from time import perf_counter
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+TIGHT_LAYOUT = {'rect': (0.01, 0.0, 1.0, 1.01)}
+
+
+def draw_panel(axes, values, color, title):
+    positions = range(len(values))
+    axes.bar(positions, values, color=color, alpha=0.8)
+    for x, y in zip(positions, values):
+        axes.annotate(f'{y:2.1f}', xy=(x, y + y / 8.0), ha='left',
+                      weight='bold', rotation_mode='anchor', rotation=45)
+    axes.set_title(title, fontsize=17)
+    axes.set_xticks(positions, [f'Week {x}' for x in positions],
+                    rotation=45, ha='right', rotation_mode='anchor')
+
+
+def three_canvases(panels):
+    canvases = []
+    for values, color, title in panels:
+        figure = Figure(figsize=(11, 3), dpi=60, tight_layout=TIGHT_LAYOUT)
+        canvases.append(FigureCanvasAgg(figure))
+        draw_panel(figure.add_subplot(1, 1, 1), values, color, title)
+    for canvas in canvases:
+        canvas.draw()
+
+
+def one_canvas(panels):
+    figure = Figure(figsize=(11, 9), dpi=60, tight_layout=TIGHT_LAYOUT)
+    canvas = FigureCanvasAgg(figure)
+    axes_list = figure.subplots(3, 1, sharex=True)
+    for axes, (values, color, title) in zip(axes_list, panels):
+        draw_panel(axes, values, color, title)
+    canvas.draw()
+
+
+def main(num_bars=26, repeats=20):
+    panels = [([20 + x % 7 for x in range(num_bars)], 'dodgerblue',
+               'Distance per week'),
+              ([10 + x % 3 for x in range(num_bars)], 'limegreen',
+               'Weekly mean speed'),
+              ([1 + x % 5 for x in range(num_bars)], 'gold',
+               'Number of sessions per week')]
+    print(f'{num_bars} bars per panel, {repeats} repeats')
+    for name, render in (('three canvases', three_canvases),
+                         ('one shared-axis canvas', one_canvas)):
+        render(panels)
+        start = perf_counter()
+        for _ in range(repeats):
+            render(panels)
+        elapsed = (perf_counter() - start) / repeats
+        print(f'{name:>24}: {elapsed * 1e3:7.1f} ms per render')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
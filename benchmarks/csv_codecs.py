@@ -0,0 +1,62 @@
+'''
+Benchmark of CSV import and export throughput and of disk savings
+for the compressed formats supported by CSVModel.
+
+Usage: python benchmarks/csv_codecs.py [number of rows]
+'''
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from running_app.models import CSVModel  # noqa: E402
+
+
+def synthetic_records(num_rows):
+    '''Running records with one session per day'''
+
+    first_day = date(1990, 1, 1)
+    records = []
+    for day in range(num_rows):
+        distance = 5 + (day * 7) % 160 / 10
+        seconds = int(distance * (270 + day % 90))
+        records.append({
+            'Date': str(first_day + timedelta(days=day)),
+            'Duration': str(timedelta(seconds=seconds)).zfill(8),
+            'Distance': distance,
+            'Pace': f'{seconds // int(distance) // 60}:'
+                    f'{seconds // int(distance) % 60:02d}',
+            'Speed': round(3600 * distance / seconds, 1),
+            'Location': 'London, UK' if day % 3 else 'Bristol, UK',
+        })
+    return records
+
+
+def main(num_rows=200000):
+    records = synthetic_records(num_rows)
+    print(f'{num_rows} rows')
+    print(f'{"codec":>6} {"size (kB)":>10} {"ratio":>6} '
+          f'{"write (rows/s)":>15} {"read (rows/s)":>14}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        plain_size = None
+        for extension in ('', '.gz', '.bz2', '.xz'):
+            csv_model = CSVModel('records.csv' + extension, tmpdir)
+            start = perf_counter()
+            csv_model.save_records(records, CSVModel.running_fields.keys())
+            write_time = perf_counter() - start
+            start = perf_counter()
+            csv_model.load_records(CSVModel.running_fields)
+            read_time = perf_counter() - start
+            size = os.path.getsize(csv_model.filename)
+            plain_size = plain_size or size
+            print(f'{csv_model.compression() or "plain":>6} '
+                  f'{size / 1e3:>10.0f} {plain_size / size:>6.1f} '
+                  f'{num_rows / write_time:>15.0f} '
+                  f'{num_rows / read_time:>14.0f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
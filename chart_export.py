@@ -0,0 +1,104 @@
+'''
+Headless export of the period bar charts and of every stored marathon
+plan to PNG or SVG files. Charts are rendered with the Agg backend,
+no display is needed, and spread over a pool of worker processes.
+
+Usage: python chart_export.py DATABASE [DATABASE ...]
+           [--periods 1 3 6 All] [--format png|svg]
+           [--output-dir charts] [--workers N]
+'''
+
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from running_app import charts as c
+from running_app.models import SQLModel
+
+
+def export_periods(database, period, output_file):
+    '''Renders the three period bar charts of a database to a file'''
+
+    start = perf_counter()
+    data_model = SQLModel(database)
+    resolution = data_model.lookback_resolution(period)
+    chart = c.BarChartFigure(['Weeks'] * 3,
+                             ['Distance (km)', 'Mean speed (km/h)',
+                              'Number of sessions'],
+                             [''] * 3, figsize=(11, 9), panels=3)
+    FigureCanvasAgg(chart.figure)
+    chart.draw_period_charts(resolution,
+                             *data_model.group_records(period, resolution))
+    chart.figure.savefig(output_file)
+    data_model.connection.close()
+    return output_file, perf_counter() - start
+
+
+def export_plan(database, table_name, output_file):
+    '''Renders the stacked bar chart of a marathon plan to a file'''
+
+    start = perf_counter()
+    data_model = SQLModel(database)
+    chart = c.BarChartFigure('Week number', 'Weekly distances (km)',
+                             c.plan_title(table_name), figsize=(15, 11))
+    FigureCanvasAgg(chart.figure)
+    chart.draw_stacked_bar_chart(
+        *data_model.get_all_program_records(table_name))
+    chart.figure.savefig(output_file)
+    data_model.connection.close()
+    return output_file, perf_counter() - start
+
+
+def chart_jobs(databases, periods, file_format, output_dir):
+    '''Export function and arguments for every chart to render'''
+
+    jobs = []
+    for database in databases:
+        name = os.path.splitext(os.path.basename(database))[0]
+        for period in periods:
+            jobs.append((export_periods, database, period, os.path.join(
+                output_dir, f'{name}_period_{period}.{file_format}')))
+        data_model = SQLModel(database)
+        for table_name in data_model.check_program_tables():
+            jobs.append((export_plan, database, table_name, os.path.join(
+                output_dir, f'{name}_plan_{table_name}.{file_format}')))
+        data_model.connection.close()
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export running charts without a display')
+    parser.add_argument('databases', nargs='+',
+                        help='SQLite databases of running records')
+    parser.add_argument('--periods', nargs='+', default=['1', '3', '6'],
+                        help="lookback periods in months, or 'All'")
+    parser.add_argument('--format', dest='file_format', default='png',
+                        choices=['png', 'svg'])
+    parser.add_argument('--output-dir', default='charts')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes, default one per core')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = chart_jobs(args.databases, args.periods, args.file_format,
+                      args.output_dir)
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(*job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                output_file, elapsed = future.result()
+            except Exception as e:
+                logging.exception(str(e))
+            else:
+                print(f'{output_file} ({elapsed:.2f} s)')
+    print(f'{len(jobs)} charts in {perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
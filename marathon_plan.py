@@ -1,35 +1,35 @@
 '''
-A program to show the weekly mileage for a full marathon training program.
+A program to show the weekly mileage for full marathon training programs.
+
+Takes plan CSV files, directories of plan CSV files or glob patterns,
+every plan is drawn in a worker process to its own '<plan name>.png'.
+
+Usage: python marathon_plan.py PLAN [PLAN ...] [--output-dir DIR]
+           [--workers N]
 
 First created: 2018-06-12.
-Last modification: 2020-08-02.
+Last modification: 2026-10-19.
 Created by Angelo Varlotta (2018).
 '''
 
-from pandas import Series, DataFrame, read_csv
+from pandas import read_csv
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.container import BarContainer
+from matplotlib.figure import Figure
 import numpy as np
-from sys import argv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
 from math import ceil
+import argparse
+import glob
 import re
 import os
 
-# use classic style
-plt.style.use('barplot-style.mplstyle')
-
-# file and title names
-fname = os.path.abspath(argv[1])
-base_file = os.path.basename(fname)
-root_file, file_ext = os.path.splitext(base_file)
-title, ext_num = re.split('_', root_file)
-title_name = title.title()+' '+str(ext_num)
-
-# distances
-dists = read_csv(fname, header=0)
-
-# weekly cumulative distances
-cumul_kms = Series({x: dists.T[x].sum() for x in dists.T.columns})
+# use classic style, found next to the program
+plt.style.use(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'barplot-style.mplstyle'))
 
 
 # truncate color map
@@ -40,49 +40,106 @@ def truncate_colormap(cmap, minval=0.0, maxval=1.0, n=100):
     return new_cmap
 
 
-cmap = plt.get_cmap('jet')
-new_cmap = truncate_colormap(cmap, 0.3, 0.8)
-
-# stacked bar plot
-ax = dists.plot(kind='bar', stacked=True, cmap=new_cmap,
-                fontsize=13, width=0.75)
-
-# annotate cumulative mileage for each week
-for lb, x, y in zip(cumul_kms.values, cumul_kms.index, cumul_kms.values):
-    plt.annotate('{0:.1f}'.format(lb), xy=(x, y), ha='center',
-                 va='bottom', size=12, weight='bold', color='k')
-
-# weekly individual mileage for each day of week
-cum_week_dists = DataFrame(
-    {wk_num: dists.loc[wk_num].cumsum() for wk_num in dists.index})
-
-# annotate individual mileage for each day of week
-for x in dists.index:
-    for lb, y in zip(dists.loc[x], cum_week_dists.T.loc[x]):
-        if lb != 0.0:
-            plt.annotate('{0:.1f}'.format(lb), xy=(x, y-1.5), ha='center',
-                         va='top', size=12, color='k')
-
-# plot legend
-ax.legend(fontsize=11, loc=0)
-
-# 5% plot padding in each direction
-# ax.margins(0.05)
-
-# x-axis label and tick labels
-ax.set_xlabel('Week number')
-ax.set_xticklabels(dists.index+1, rotation=0)
-
-# y-axis tick frequency and label
-ax.set_yticks(range(ceil(cumul_kms.max())), minor=True)
-ax.set_ylabel('Weekly total distance (km)')
-
-# plot title
-ax.set_title('Weekly progression for '+str(title_name) +
-             ' marathon training program')
-
-# grid style: dotted
-# ax.grid(linestyle=':')
-# plt.tight_layout()
-plt.savefig('stacked2.png')
-# plt.show()
+def plan_files(paths):
+    '''Expands directories and glob patterns into plan CSV files'''
+
+    fnames = []
+    for path in paths:
+        if os.path.isdir(path):
+            fnames.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        else:
+            fnames.extend(sorted(glob.glob(path)) or [path])
+    # each plan once, in the order given
+    return list(dict.fromkeys(os.path.abspath(fname) for fname in fnames))
+
+
+def draw_plan(fname, output_dir):
+    '''Draws the stacked weekly distances of a plan to a PNG file,
+    returns the output file name and the time taken'''
+
+    start = perf_counter()
+
+    # file and title names, e.g. 'london_2018.csv' gives 'London 2018'
+    root_file, file_ext = os.path.splitext(os.path.basename(fname))
+    title, *ext_num = re.split('_', root_file)
+    title_name = ' '.join([title.title()] + ext_num)
+
+    # distances
+    dists = read_csv(fname, header=0)
+
+    # weekly cumulative distances, one operation over all weeks,
+    # daily stacks are computed by the stacked bar plot
+    cumul_kms = dists.sum(axis=1)
+
+    cmap = plt.get_cmap('jet')
+    new_cmap = truncate_colormap(cmap, 0.3, 0.8)
+
+    # stacked bar plot, on its own figure outside of pyplot
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(1, 1, 1)
+    dists.plot(kind='bar', stacked=True, cmap=new_cmap,
+               fontsize=13, width=0.75, ax=ax)
+
+    # annotate cumulative mileage for each week on the top segments
+    ax.bar_label(ax.containers[-1],
+                 labels=['{0:.1f}'.format(lb) for lb in cumul_kms.values],
+                 size=12, weight='bold', color='k')
+
+    # annotate individual mileage for each day of week, one call per
+    # day of week for the days with a session
+    for day, container in zip(dists.columns, ax.containers):
+        run_weeks = np.flatnonzero(dists[day].values)
+        ax.bar_label(BarContainer([container.patches[i] for i in run_weeks],
+                                  datavalues=dists[day].values[run_weeks],
+                                  orientation='vertical'),
+                     fmt='%.1f', label_type='center', size=12, color='k')
+
+    # plot legend
+    ax.legend(fontsize=11, loc=0)
+
+    # x-axis label and tick labels
+    ax.set_xlabel('Week number')
+    ax.set_xticklabels(dists.index+1, rotation=0)
+
+    # y-axis tick frequency and label
+    ax.set_yticks(range(ceil(cumul_kms.max())), minor=True)
+    ax.set_ylabel('Weekly total distance (km)')
+
+    # plot title
+    ax.set_title('Weekly progression for '+str(title_name) +
+                 ' marathon training program')
+
+    output_file = os.path.join(output_dir, root_file+'.png')
+    figure.savefig(output_file)
+    return output_file, perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Weekly mileage of marathon training programs')
+    parser.add_argument('plans', nargs='+',
+                        help='plan CSV files, directories or glob patterns')
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes, default one per core')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    fnames = plan_files(args.plans)
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(draw_plan, fname, args.output_dir): fname
+                   for fname in fnames}
+        for future in as_completed(futures):
+            try:
+                output_file, elapsed = future.result()
+            except Exception as e:
+                print(f'{futures[future]}: {e}')
+            else:
+                print(f'{output_file} ({elapsed:.2f} s)')
+    print(f'{len(fnames)} plans in {perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
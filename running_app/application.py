@@ -4,8 +4,22 @@ from tkinter import ttk, messagebox, filedialog
 from . import views as v
 from . import models as m
 from . import network as n
+from . import jobs as j
 import os
+import queue
+import sqlite3
+import threading
 from datetime import timedelta
+from matplotlib import use as mpl_use
+
+# Supported values for backend are ['GTK3Agg', 'GTK3Cairo',
+# 'GTK4Agg', 'GTK4Cairo', 'MacOSX',
+# 'nbAgg', 'QtAgg', 'QtCairo', 'Qt5Agg', 'Qt5Cairo', 'TkAgg',
+# 'TkCairo', 'WebAgg', 'WX', 'WXAgg', 'WXCairo', 'agg', 'cairo',
+# 'pdf', 'pgf', 'ps', 'svg', 'template']
+# set for the application window only, the charts module itself
+# works with any backend
+mpl_use("TkAgg")
 
 
 class Application(tk.Tk):
@@ -17,6 +31,17 @@ class Application(tk.Tk):
         'Windows': "~/AppData/Local/RunningApp",
     }
 
+    # file dialog types, compressed files are read and written transparently
+    csv_filetypes = [('Comma-Separated Values', '*.csv *.CSV'),
+                     ('Compressed CSV (gzip, bzip2, xz)', '*.gz *.bz2 *.xz'),
+                     ('All files', '*')]
+
+    # live search: pause in ms after the last change of a search bound
+    # before querying, rows per streamed chunk and the chunk poll interval
+    search_delay = 150
+    search_chunk = 500
+    search_poll = 50
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -37,8 +62,18 @@ class Application(tk.Tk):
         ttk.Label(self, text='Weekly progression bar charts', font=('TkDefaultFont', 16),
                   foreground='black', background='#ECECEC').grid(row=0, padx=60, pady=2)
 
-        self.inserted_rows = []
-        self.updated_rows = []
+        # records written this session, by date: the row tag of
+        # the last write of each, shared with the record lists
+        self.edited_rows = {}
+        # dates of the records holding a personal best
+        self.personal_best_dates = set()
+
+        # live search: pending debounce timer, token of the current
+        # search, model of its worker thread and the queue of its chunks
+        self.search_after = None
+        self.search_token = 0
+        self.search_model = None
+        self.search_results = queue.Queue()
 
         # default filename
         self.filename = tk.StringVar()
@@ -67,6 +102,7 @@ class Application(tk.Tk):
             # menu bar callbacks
             'file->import': self.file_import,
             'file->export': self.file_export,
+            'file->cancel_jobs': self.cancel_jobs,
             'file->add_plan': self.add_plan,
             'on_show_plan': self.show_plan,
             'on_open_remove_plan_window': self.open_remove_plan_window,
@@ -75,9 +111,12 @@ class Application(tk.Tk):
             'on_insert': self.insert,
             'on_remove': self.remove,
             'on_remove_plan': self.remove_plan,
+            'on_set_plan_start': self.set_plan_start,
             'on_period_dropdown': self.period_dropdown,
             'on_open_search_window': self.open_search_window,
             'on_search': self.search,
+            'on_search_changed': self.schedule_search,
+            'on_show_personal_bests': self.show_personal_bests,
         }
 
         self.menu = v.MainMenu(self, self.callbacks,
@@ -87,16 +126,21 @@ class Application(tk.Tk):
         # create database and table if non-existent
         self.data_model.create_db_and_primary_table()
 
-        # bar chart plots
-        self.barcharts = v.BarChartView(self,
-                                        self.data_model.group_records)
+        # bar chart plots, prepared chart data is cached until
+        # the next write to the database
+        self.chart_cache = m.ChartCache(maxsize=32)
+        self.barcharts = v.BarChartView(
+            self, self.data_model.group_records,
+            self.data_model.group_training_load,
+            self.data_model.lookback_resolution,
+            lambda: self.data_model.write_generation, self.chart_cache)
         self.barcharts.grid(row=1, column=0, sticky=('NSEW'))
         self.barcharts.columnconfigure(0, weight=1)
 
         # treeview record form
         self.recordlist = v.RecordList(self, self.callbacks,
-                                       inserted=self.inserted_rows,
-                                       updated=self.updated_rows,)
+                                       edited=self.edited_rows,
+                                       personal_bests=self.personal_best_dates)
         self.recordlist.grid(row=1, column=1, padx=10, sticky='NSEW')
         self.recordlist.columnconfigure(0, weight=1)
         self.populate_recordlist()
@@ -110,10 +154,12 @@ class Application(tk.Tk):
                                                               get(),
                                                               self.settings
                                                               ['country_code'].
-                                                              get()))
+                                                              get()),
+                                                self.data_model.race_distances)
         self.selectform.grid(row=2, column=0, padx=4, pady=(25, 0),
                              sticky=('NSEW'))
         self.selectform.columnconfigure(0, weight=1)
+        self.show_predictions()
 
         # data record form
         self.recordform = v.DataRecordForm(self,
@@ -129,6 +175,11 @@ class Application(tk.Tk):
         self.statusbar.grid(row=3, column=0, padx=10, sticky=('WE'))
         self.statusbar.columnconfigure(0, weight=1)
 
+        # imports, exports and plan imports run as background jobs
+        # reporting to the status bar, jobs are cancelled on closing
+        self.jobs = j.JobScheduler(self, self.show_job_progress)
+        self.protocol('WM_DELETE_WINDOW', self.on_close)
+
         self.records_saved = 0
         self.records_updated = 0
         self.records_deleted = 0
@@ -137,7 +188,8 @@ class Application(tk.Tk):
         '''refresh treeview with records'''
 
         try:
-            rows = self.data_model.get_all_records()
+            count = self.data_model.count_records()
+            self.refresh_personal_bests()
         except Exception as e:
             messagebox.showerror(
                 title='Error',
@@ -145,7 +197,46 @@ class Application(tk.Tk):
                 detail=str(e)
             )
         else:
-            self.recordlist.populate(rows)
+            # only the rows in view are read, page by page
+            self.recordlist.set_source(count,
+                                       self.data_model.get_records_page)
+
+    def update_recordlist(self):
+        '''Applies the last write of the model to the record list,
+        only the rows in view are redrawn'''
+
+        try:
+            self.refresh_personal_bests()
+        except Exception as e:
+            messagebox.showerror(
+                title='Error',
+                message='Problem reading database',
+                detail=str(e)
+            )
+        else:
+            self.recordlist.apply_change(*self.data_model.last_rows)
+
+    def refresh_personal_bests(self):
+        # updated in place, the set is shared with the record lists
+        self.personal_best_dates.clear()
+        self.personal_best_dates.update(self.data_model.personal_best_dates())
+
+    def show_personal_bests(self):
+        '''Shows the personal best of every category'''
+
+        lines = []
+        for category, best in self.data_model.get_personal_bests().items():
+            if category.startswith('Pace'):
+                value = (self.data_model.pace_string(3600/best['Value']) +
+                         ' min/km')
+            elif category == 'Longest duration':
+                value = str(timedelta(seconds=int(best['Value'])))
+            else:
+                value = f'''{best['Value']:.1f} km'''
+            lines.append(f'''{category}: {value} ({best['Date']})''')
+        messagebox.showinfo(title='Personal bests',
+                            message='Personal bests',
+                            detail='\n'.join(lines) or 'No records yet')
 
     def open_record(self, rowkey=None):
         '''rowkey is simply date, while data contains
@@ -178,6 +269,8 @@ class Application(tk.Tk):
             )
             messagebox.showerror(title='Error', message=message, detail=detail)
             return False
+        if self.writer_busy():
+            return False
 
         # get data and add 'Pace' and 'Speed' columns
         data = self.data_model.data_addition(self.recordform.get())
@@ -194,21 +287,20 @@ class Application(tk.Tk):
             self.records_updated += 1
             self.status.set(f'{self.records_updated}'
                             f'record(s) updated this session')
-            key = (str(data['Date']), str(data['Duration']),
-                   str(data['Distance']), str(data['Pace']),
-                   str(data['Speed']), str(data['Location']))
             # updated record
             if self.data_model.last_write == 'update record':
-                self.updated_rows.append(key)
+                self.edited_rows[data['Date']] = 'updated_record'
             # added record
             elif self.data_model.last_write == 'insert record':
-                self.inserted_rows.append(key)
-            self.populate_recordlist()
+                self.edited_rows[data['Date']] = 'inserted_record'
+            self.update_recordlist()
             self.period_dropdown()
 
     def remove(self):
         '''Removes record from database'''
 
+        if self.writer_busy():
+            return
         # get data
         data = self.recordform.get()
         try:
@@ -224,90 +316,198 @@ class Application(tk.Tk):
             self.records_deleted += 1
             self.status.set(f'{self.records_deleted}'
                             f'record(s) deleted this session')
+            self.edited_rows.pop(data['Date'], None)
             self.recordform.reset()
-            self.populate_recordlist()
+            self.update_recordlist()
             self.period_dropdown()
 
     # import records from CSV file to database
     def file_import(self):
-        '''Handles the file->import action from the menu'''
+        '''Handles the file->import action from the menu, the import runs
+        as a writer job. Progress is checkpointed after every batch so
+        a failed or cancelled import resumes from the last committed
+        batch and a complete one is skipped. Records are merged, only
+        new and changed ones are written'''
 
         filename = filedialog.askopenfilename(
             title='Select the file to import into the database',
             defaultextension='.csv',
-            filetypes=[('Comma-Separated Values', '*.csv, *.CSV')]
+            filetypes=self.csv_filetypes
         )
         if filename:
             self.filename.set(filename)
+            self.submit_job(f'Import of {os.path.basename(filename)}',
+                            self.import_records, filename, writer=True,
+                            on_done=self.records_imported,
+                            on_error=self.import_failed)
+
+    def import_records(self, job, filename):
+        '''Import job, merges the records of a CSV file on its own
+        connection. The derived tables are rebuilt once after the last
+        batch, or after the batches written before an error or a
+        cancellation. Returns the file name and the numbers of new,
+        changed and identical records, None when the file was already
+        imported in full'''
+
+        data_model = m.SQLModel(self.data_model.database)
+        try:
+            csv_read = m.CSVModel(filename=filename, filepath=None)
+            job.report('hashing file')
+            file_hash = csv_read.content_hash()
+            checkpoint = data_model.get_import(file_hash)
+            if checkpoint.get('Complete'):
+                return filename, None
+            if not checkpoint:
+                checkpoint = {'File_Hash': file_hash,
+                              'Filename': filename, 'Byte_Offset': 0,
+                              'Batch': 0, 'Rows': 0, 'Complete': 0}
+            checkpoint['Filename'] = filename
+            # byte offsets are in the decompressed stream, the
+            # fraction done is only known for plain files
+            size = (os.path.getsize(filename)
+                    if csv_read.compression() is None else None)
+            summary = {'new': 0, 'changed': 0, 'identical': 0}
             try:
-                csv_read = m.CSVModel(filename=self.filename.get(),
-                                      filepath=None)
-            except Exception as e:
-                messagebox.showerror(
-                    title='Error',
-                    message='Problem reading file',
-                    detail=str(e)
-                )
-            else:
-                try:
-                    records = csv_read.load_records(csv_read.running_fields)
-                    for row in records:
-                        row = self.data_model.data_addition(row)
-                        self.data_model.add_record(row)
-                    self.status.set(f'Loaded running records into '
-                                    f'''{self.settings['db_name'].get()}''')
-                    self.populate_recordlist()
-                    self.period_dropdown()
-                except TypeError:
-                    messagebox.showerror(
-                        title='Error',
-                        message='Cannot add data to table',
-                    )
+                index = data_model.record_hash_index()
+                for records, offset in csv_read.iter_record_batches(
+                        csv_read.running_fields,
+                        offset=checkpoint['Byte_Offset']):
+                    records = [data_model.data_addition(row)
+                               for row in records]
+                    progress = dict(checkpoint, Byte_Offset=offset,
+                                    Batch=checkpoint['Batch'] + 1,
+                                    Rows=checkpoint['Rows'] + len(records))
+                    batch_summary = data_model.merge_records(
+                        records, index, progress, defer_derived=True)
+                    checkpoint = progress
+                    for key, count in batch_summary.items():
+                        summary[key] += count
+                    job.report(f'{checkpoint["Rows"]} records read',
+                               size and offset/size)
+            except (TypeError, ValueError, IndexError) as e:
+                raise ValueError(
+                    f'{e}\nImport resumes after batch '
+                    f'{checkpoint["Batch"]} on the next attempt.') from e
+            finally:
+                if data_model.derived_stale():
+                    data_model.rebuild_derived()
+            checkpoint['Complete'] = 1
+            data_model.save_import(checkpoint)
+            return filename, summary
+        finally:
+            data_model.connection.close()
+
+    def records_imported(self, result):
+        filename, summary = result
+        if summary is None:
+            self.status.set(f'{os.path.basename(filename)} was '
+                            f'already imported, skipped')
+            return
+        self.records_written()
+        self.status.set(f'Loaded running records into '
+                        f'''{self.settings['db_name'].get()}''')
+        messagebox.showinfo(
+            title='Import summary',
+            message=f'Imported {os.path.basename(filename)}',
+            detail='New records: {new}\nChanged records: '
+                   '{changed}\nIdentical records: '
+                   '{identical}'.format(**summary)
+        )
+
+    def import_failed(self, error):
+        # the batches committed before the error are kept
+        self.records_written()
+        if isinstance(error, j.JobCancelled):
+            self.status.set('Import cancelled, it resumes after the last '
+                            'committed batch on the next attempt')
+        else:
+            messagebox.showerror(
+                title='Error',
+                message='Cannot add data to table',
+                detail=str(error)
+            )
 
     def file_export(self):
-        '''Handles the file->export action from the menu'''
+        '''Handles the file->export action from the menu, the export
+        runs as a background job'''
 
         filename = filedialog.asksaveasfilename(
             title='Select the target file for saving records',
             defaultextension='.csv',
-            filetypes=[('Comma-Separated Values', '*.csv *.CSV')]
+            filetypes=self.csv_filetypes
         )
         if filename:
             self.filename.set(filename)
-            try:
-                rows = self.data_model.get_all_records()
-            except Exception as e:
-                messagebox.showerror(
-                    title='Error',
-                    message='Problem reading database',
-                    detail=str(e)
-                )
-            else:
-                self.status.set(f'Saved data to {self.filename.get()}')
-                csv_write = m.CSVModel(filename=self.filename.get(),
-                                       filepath=None)
-                csv_write.save_records(rows, csv_write.running_fields.keys())
+            self.submit_job(f'Export to {os.path.basename(filename)}',
+                            self.export_records, filename,
+                            on_done=lambda filename: self.status.set(
+                                f'Saved data to {filename}'),
+                            on_error=self.export_failed)
+
+    def export_records(self, job, filename):
+        '''Export job, reads the records on its own connection and
+        saves them to a CSV file. Returns the file name'''
+
+        data_model = m.SQLModel(self.data_model.database)
+        try:
+            rows = data_model.get_all_records()
+        finally:
+            data_model.connection.close()
+
+        def reported(rows):
+            for count, row in enumerate(rows, 1):
+                if count % 1000 == 0:
+                    job.report(f'{count} of {len(rows)} records saved',
+                               count/len(rows))
+                yield row
+
+        csv_write = m.CSVModel(filename=filename, filepath=None)
+        csv_write.save_records(reported(rows),
+                               csv_write.running_fields.keys())
+        return filename
+
+    def export_failed(self, error):
+        if isinstance(error, j.JobCancelled):
+            self.status.set('Export cancelled, the file is incomplete')
+        else:
+            messagebox.showerror(
+                title='Error',
+                message='Problem exporting records',
+                detail=str(error)
+            )
 
     def period_dropdown(self):
+        '''Redraws the bar charts in place over the selected period,
+        and the race predictions after a write'''
+
         period = self.selectform.period_val.get()
-        self.barcharts = v.BarChartView(self, self.data_model.group_records,
-                                        period)
-        self.barcharts.grid(row=1, column=0, sticky=(tk.W + tk.E))
+        self.barcharts.refresh(period)
+        self.show_predictions()
+
+    def show_predictions(self):
+        '''Shows race time predictions, computed again only after
+        a write to the database'''
+
+        self.selectform.set_predictions(*self.chart_cache.get(
+            ('predictions', self.data_model.write_generation),
+            self.data_model.predict_race_times))
 
     def add_plan(self):
-        '''Handles marathon program import and saves data to the database,
-        creates a menu bar entry to view marathon program bar chart'''
+        '''Handles marathon program import and saves data to the database
+        in a writer job, creates a menu bar entry to view marathon program
+        bar chart'''
 
         filename = filedialog.askopenfilename(
             title='Select the file to import into the database',
             defaultextension='.csv',
-            filetypes=[('Comma-Separated Values', '*.csv *.CSV')]
+            filetypes=self.csv_filetypes
         )
         if filename:
             self.filename.set(filename)
             try:
                 csv_read = m.CSVModel(filename=self.filename.get(),
                                       filepath=None)
+                records = csv_read.load_records(csv_read.program_fields)
             except Exception as e:
                 messagebox.showerror(
                     title='Error',
@@ -315,38 +515,111 @@ class Application(tk.Tk):
                     detail=str(e)
                 )
             else:
-                basename, _ = os.path.splitext(os.path.basename(
-                    self.filename.get())
-                    )
-                try:
-                    self.data_model.create_program_table(basename)
-                except Exception as e:
+                if records is None:
                     messagebox.showerror(
                         title='Error',
-                        message='Problem creating table in database',
-                        detail=str(e)
+                        message='Cannot add data to table',
+                    )
+                    return
+                basename, _ = os.path.splitext(os.path.basename(
+                    self.filename.get())
                     )
-                else:
-                    try:
-                        records = csv_read.load_records(
-                            csv_read.program_fields
-                            )
-                        for row in records:
-                            self.data_model.add_program_record(basename, row)
-                        messagebox.showinfo(
-                                title='Adding program',
-                                message=f'Added {basename} program.\n'
-                                        f'Press button to continue.',
-                            )
-                        self.status.set(f'Loaded {basename} records into '
-                                        f"{self.settings['db_name'].get()}")
-                        self.menu.add_program_menu(basename)
-                    except TypeError:
-                        messagebox.showerror(
-                            title='Error',
-                            message='Cannot add data to table',
-                        )
-                        self.data_model.remove_program_table(basename)
+                self.submit_job(f'Import of {basename} program',
+                                self.import_plan, basename, records,
+                                writer=True, on_done=self.plan_imported,
+                                on_error=self.plan_failed)
+
+    def import_plan(self, job, basename, records):
+        '''Plan import job, writes a marathon program table on its own
+        connection, the table is removed again if the import fails.
+        Returns the program name'''
+
+        data_model = m.SQLModel(self.data_model.database)
+        try:
+            data_model.create_program_table(basename)
+            try:
+                for week, row in enumerate(records, 1):
+                    job.report(f'week {week} of {len(records)}',
+                               week/len(records))
+                    data_model.add_program_record(basename, row)
+            except (TypeError, j.JobCancelled):
+                data_model.remove_program_table(basename)
+                raise
+            return basename
+        finally:
+            data_model.connection.close()
+
+    def plan_imported(self, basename):
+        self.data_model.mark_written()
+        messagebox.showinfo(
+                title='Adding program',
+                message=f'Added {basename} program.\n'
+                        f'Press button to continue.',
+            )
+        self.status.set(f'Loaded {basename} records into '
+                        f"{self.settings['db_name'].get()}")
+        self.menu.add_program_menu(basename)
+
+    def plan_failed(self, error):
+        self.data_model.mark_written()
+        if isinstance(error, j.JobCancelled):
+            self.status.set('Program import cancelled')
+        elif isinstance(error, TypeError):
+            messagebox.showerror(
+                title='Error',
+                message='Cannot add data to table',
+            )
+        else:
+            messagebox.showerror(
+                title='Error',
+                message='Problem creating table in database',
+                detail=str(error)
+            )
+
+    def submit_job(self, name, function, *args, **kwargs):
+        '''Runs a background job, unless one of the same name runs'''
+
+        try:
+            self.jobs.submit(name, function, *args, **kwargs)
+        except ValueError as e:
+            messagebox.showerror(title='Error', message=str(e))
+
+    def show_job_progress(self, job, message, fraction):
+        if fraction is not None:
+            message += f' ({fraction:.0%})'
+        self.status.set(f'{job.name}: {message}')
+
+    def cancel_jobs(self):
+        '''Handles the file->cancel_jobs action from the menu'''
+
+        self.jobs.cancel()
+
+    def writer_busy(self):
+        '''Tells, with an error dialog, whether a writer job is running,
+        writes from the Tk thread would wait for it to finish'''
+
+        writing = self.jobs.writing()
+        if writing:
+            messagebox.showerror(
+                title='Error',
+                message='Database busy',
+                detail=f'Wait for {", ".join(writing)} to finish, or '
+                       f'cancel it from the File menu.'
+            )
+        return bool(writing)
+
+    def records_written(self):
+        '''Shows the records written by a job on its own connection'''
+
+        self.data_model.mark_written()
+        self.populate_recordlist()
+        self.period_dropdown()
+
+    def on_close(self):
+        '''Cancels the running jobs before closing the application'''
+
+        self.jobs.shutdown()
+        self.destroy()
 
     def show_plan(self, table_name):
         '''opens new window for marathon program stacked bar chart'''
@@ -357,11 +630,16 @@ class Application(tk.Tk):
 
         # get marathon plan data
         try:
-            days_of_week, weekly_distances = \
-                self.data_model.get_all_program_records(table_name)
-            stackedbarchart = v.StackedBarChartView(plan_window, table_name,
-                                                    days_of_week,
-                                                    weekly_distances)
+            days_of_week, weekly_distances = self.chart_cache.get(
+                ('plan', self.data_model.write_generation, table_name),
+                lambda: self.data_model.get_all_program_records(table_name))
+            adherence = self.plan_adherence(table_name)
+            stackedbarchart = v.StackedBarChartView(
+                plan_window, table_name, days_of_week, weekly_distances,
+                self.data_model.program_fields, self.callbacks,
+                adherence and adherence['Start'])
+            if adherence is not None:
+                stackedbarchart.draw_adherence(adherence)
         except Exception as e:
             messagebox.showerror(
                 title='Error',
@@ -372,6 +650,30 @@ class Application(tk.Tk):
             stackedbarchart.grid(row=0, padx=5, pady=5, sticky='NSEW')
             stackedbarchart.columnconfigure(0, weight=1)
 
+    def plan_adherence(self, table_name):
+        '''Planned versus actual distances of a scheduled marathon
+        program, cached until the next write'''
+
+        return self.chart_cache.get(
+            ('adherence', self.data_model.write_generation, table_name),
+            lambda: self.data_model.plan_adherence(table_name))
+
+    def set_plan_start(self, table_name, start_date):
+        '''Schedules a marathon program and returns its adherence'''
+
+        if self.writer_busy():
+            return None
+        try:
+            self.data_model.set_plan_start(table_name, start_date)
+        except ValueError:
+            messagebox.showerror(
+                title='Error',
+                message='Cannot schedule program',
+                detail=f'Invalid start date: {start_date}'
+            )
+            return None
+        return self.plan_adherence(table_name)
+
     def open_remove_plan_window(self):
         '''opens new window for marathon program removal'''
 
@@ -400,6 +702,8 @@ class Application(tk.Tk):
     def remove_plan(self):
         '''Removes property from database'''
 
+        if self.writer_busy():
+            return
         # get table
         table = self.deletetableform.get()
         try:
@@ -428,23 +732,27 @@ class Application(tk.Tk):
         advanced_window = tk.Toplevel(self)
         advanced_window.resizable(width=False, height=False)
         advanced_window.title('Advanced search')
-
-        # advanced selection form
-        min_date = self.data_model.min_max_column_values()[0]
-        max_date = self.data_model.min_max_column_values()[1]
-        valid_dates = self.data_model.get_dates(min_date, max_date)
+        advanced_window.protocol('WM_DELETE_WINDOW', lambda: (
+            self.cancel_search(), advanced_window.destroy()))
+
+        # advanced selection form, the sorted dates completing the
+        # date fields are cached until the next write
+        date_index = self.chart_cache.get(
+            ('dates', self.data_model.write_generation),
+            lambda: m.DateIndex(self.data_model.get_dates()))
         self.advancedsearch = v.SearchForm(advanced_window,
                                            self.data_model.running_fields,
                                            self.callbacks,
-                                           valid_dates=valid_dates)
+                                           date_index=date_index)
         self.advancedsearch.grid(row=0, column=0, padx=6,
                                  pady=6, sticky='NSEW')
         self.advancedsearch.columnconfigure(0, weight=1)
 
         # treeview record form
         self.search_recordlist = v.RecordList(advanced_window, self.callbacks,
-                                              inserted=self.inserted_rows,
-                                              updated=self.updated_rows,)
+                                              edited=self.edited_rows,
+                                              personal_bests=(
+                                                  self.personal_best_dates))
         self.search_recordlist.grid(row=1, column=0, padx=10, sticky='NSEW')
         self.search_recordlist.columnconfigure(0, weight=1)
 
@@ -456,55 +764,134 @@ class Application(tk.Tk):
         self.search_statusbar.grid(row=2, column=0, padx=10, sticky=('WE'))
         self.search_statusbar.columnconfigure(0, weight=1)
 
-    def search(self):
+    def schedule_search(self):
+        '''Runs a live search once the search bounds are left
+        unchanged for search_delay ms'''
+
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+        self.search_after = self.after(self.search_delay, self.search, True)
+
+    def search(self, live=False):
+        '''Starts a search on a worker thread, a live search doesn't
+        show error dialogs while the bounds are being typed'''
+
+        self.cancel_search()
 
         # check for errors first
         errors = self.advancedsearch.get_errors()
         if errors:
-            message = 'Cannot search for record(s)'
-            detail = 'The following fields have errors: \n * {}'\
-                     .format('\n * '.join(errors.keys()))
             self.search_status.set('Cannot search for record(s)')
-            messagebox.showerror(title='Error', message=message, detail=detail)
+            if not live:
+                message = 'Cannot search for record(s)'
+                detail = 'The following fields have errors: \n * {}'\
+                         .format('\n * '.join(errors.keys()))
+                messagebox.showerror(title='Error', message=message,
+                                     detail=detail)
             return False
+        self.search_status.set('Searching...')
+        threading.Thread(target=self.search_worker,
+                         args=(self.search_token, self.advancedsearch.get()),
+                         daemon=True).start()
+        self.after(self.search_poll, self.drain_search, self.search_token, 0,
+                   live)
+
+    def cancel_search(self):
+        '''Drops a pending live search, and the chunks of the search
+        in flight after interrupting its query'''
+
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+            self.search_after = None
+        self.search_token += 1
+        if self.search_model is not None:
+            try:
+                self.search_model.connection.interrupt()
+            except sqlite3.ProgrammingError:
+                # the worker closed its connection already
+                pass
+
+    def search_worker(self, token, search_inputs):
+        '''Runs a search on its own connection, queuing the records
+        in chunks tagged with the search token, then their summary.
+        Runs off the Tk thread, so it mustn't touch any widget'''
+
+        data_model = m.SQLModel(self.data_model.database)
+        self.search_model = data_model
         try:
-            search_inputs = self.advancedsearch.get()
-            search_outputs = self.data_model.get_record_range(**search_inputs)
+            for rows in data_model.iter_record_range(self.search_chunk,
+                                                     **search_inputs):
+                if token != self.search_token:
+                    return
+                self.search_results.put((token, rows))
+            self.search_results.put(
+                (token, data_model.search_summary(**search_inputs)))
         except Exception as e:
-            messagebox.showerror(
-                title='Error',
-                message='Problem searching for record(s)',
-                detail=str(e)
-            )
-            self.search_status.set('Problem searching for record(s)')
-        else:
-            self.search_recordlist.populate(search_outputs)
-            cols = "Count: {} | Distance: {} km | " + \
-                "Mean speed: {} km/hr | Duration: {} hr"
-            self.search_status.set(cols.format(
-                *self._stats_summary(search_outputs))
-                )
+            self.search_results.put((token, e))
+        finally:
+            data_model.connection.close()
 
-    def _stats_summary(self, search_outputs):
-        count, tot_dist, sum_speed, tot_time, mean_speed = 0, 0, 0, 0, 0
-        for row in search_outputs:
-            count += 1
-            tot_dist += row['Distance']
-            sum_speed += row['Speed']
-            tot_time += timedelta(hours=int(row['Duration'][0:2]),
-                                  minutes=int(row['Duration'][3:5]),
-                                  seconds=int(row['Duration'][6:8]),
-                                  microseconds=0).total_seconds()
-        tot_dist = str(round(tot_dist, 2))
-        try:
-            mean_speed = str(round(sum_speed/len(search_outputs), 2))
-        except ZeroDivisionError:
-            messagebox.showerror(
-                title='Error',
-                message='No record(s) in search',
-            )
-        tot_time = str(timedelta(seconds=tot_time))
-        return count, tot_dist, mean_speed, tot_time
+    def drain_search(self, token, count, live=False):
+        '''Shows the chunks queued by the search worker, skipping
+        those of cancelled searches, until the search summary. Results
+        of a live search don't take the focus from the search form and
+        its errors are only shown in the status bar'''
+
+        while token == self.search_token:
+            try:
+                item_token, item = self.search_results.get_nowait()
+            except queue.Empty:
+                self.after(self.search_poll, self.drain_search, token, count,
+                           live)
+                return
+            if item_token != token:
+                continue
+            if isinstance(item, Exception):
+                if not live:
+                    messagebox.showerror(
+                        title='Error',
+                        message='Problem searching for record(s)',
+                        detail=str(item)
+                    )
+                self.search_status.set('Problem searching for record(s)')
+                return
+            if isinstance(item, dict):
+                break
+            # the first chunk replaces the previous results
+            if count == 0:
+                self.search_recordlist.populate(item, focus=not live)
+            else:
+                self.search_recordlist.extend(item)
+            count += len(item)
+            self.search_status.set(f'Searching... {count} record(s)')
+        else:
+            # a newer search took over
+            return
+        if count == 0:
+            self.search_recordlist.populate([], focus=False)
+            self.search_status.set('No record(s) in search')
+            return
+        self.search_status.set(self.summary_text(item))
+
+    @staticmethod
+    def summary_text(summary):
+        '''Status bar text of a search summary'''
+
+        def pace(seconds):
+            return '{}:{:02}'.format(*divmod(round(seconds), 60))
+
+        text = ('Count: {Count} | Distance: {Distance} km | '
+                'Duration: {} hr | ').format(
+                    timedelta(seconds=summary['Seconds']), **summary)
+        text += ('Speed: mean {Mean speed:.2f}, median {Median speed:.2f}, '
+                 'p90 {P90 speed:.2f} km/hr | ').format(**summary)
+        if 'Median pace' in summary:
+            text += 'Pace: mean {}, median {}, p90 {} min/km | '.format(
+                pace(summary['Mean pace']), pace(summary['Median pace']),
+                pace(summary['P90 pace']))
+        return text + 'Longest: {} km, {}'.format(
+            summary['Longest distance'],
+            timedelta(seconds=summary['Longest seconds']))
 
     def load_settings(self):
         '''Load settings into our self.settings dict'''
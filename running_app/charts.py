@@ -0,0 +1,294 @@
+"""Bar charts drawn on plain matplotlib figures, independent of the
+backend, used by the Tk widgets and by the headless chart export"""
+
+from math import ceil
+from re import split
+from numpy import arange, asarray, cumsum, flatnonzero, linspace
+
+# matplotlib
+from matplotlib.figure import Figure
+from matplotlib import ticker
+from matplotlib.transforms import ScaledTranslation
+from matplotlib.container import BarContainer
+from matplotlib import pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap
+
+# To list all available styles, use: print(plt.style.available)
+# https://matplotlib.org/stable/tutorials/introductory/customizing.html
+plt.style.use("fivethirtyeight")
+# silences warning: INFO matplotlib.category: Using categorical units
+# to plot a list of strings that are all parsable as floats or dates.
+# If these strings should be plotted as numbers, cast to the appropriate
+# data type before plotting.
+plt.set_loglevel("WARNING")
+
+
+def truncate_colormap(cmap, minval=0.0, maxval=1.0, n=100):
+    new_cmap = LinearSegmentedColormap.from_list(
+        "trunc({n},{a:.2f},{b:.2f})".format(n=cmap.name,
+                                            a=minval, b=maxval),
+        cmap(linspace(minval, maxval, n)),
+    )
+    return new_cmap
+
+
+def plan_title(table_name):
+    """Title of the stacked bar chart of a marathon program"""
+
+    title_name = " ".join(split(r"[\-_+.]", table_name))
+    return ("Weekly progression for " + title_name +
+            " marathon training program")
+
+
+class BarChartFigure:
+    """Figure of bar charts on running, 'panels' stacks that many
+    bar charts sharing the x-axis"""
+
+    # annotations and tick labels beyond this count are thinned out
+    max_labels = 40
+
+    # axis label, 'per' noun and adjective of each chart resolution
+    resolution_labels = {
+        "week": ("Weeks", "week", "Weekly"),
+        "month": ("Months", "month", "Monthly"),
+        "year": ("Years", "year", "Yearly"),
+    }
+
+    def __init__(self, x_label, y_label, title, figsize=(11, 3), panels=1):
+        self.figure = Figure(figsize=figsize, dpi=60,
+                             tight_layout={"rect": (0.01, 0.0, 1.0, 1.01)}
+                             )
+        # axes, labels and titles are given per panel when stacked
+        if panels == 1:
+            x_label, y_label, title = [x_label], [y_label], [title]
+        self.axes_list = self.figure.subplots(panels, 1, sharex=True,
+                                              squeeze=False)[:, 0]
+        self.axes = self.axes_list[0]
+        for axes, y_text, title_text in zip(self.axes_list, y_label, title):
+            axes.set_ylabel(y_text, fontsize=15)
+            axes.set_title(title_text, fontsize=17)
+        self.axes_list[-1].set_xlabel(x_label[-1], fontsize=15)
+        # artists kept between redraws, per panel
+        self.bars = [None] * panels
+        self.annotations = [[] for _ in range(panels)]
+        self.lines = [None] * panels
+
+    def set_labels(self, x_label, title, panel=0):
+        self.axes_list[-1].set_xlabel(x_label, fontsize=15)
+        self.axes_list[panel].set_title(title, fontsize=17)
+
+    def draw_bar_chart(self, periods, total_distances, color,
+                       integer=False, panel=0, labels=None):
+        """Draws the bars of a panel, the bars already drawn are updated
+        in place when their number doesn't change. Bars are annotated
+        with their heights, or with 'labels' when given. The canvas
+        redraws when idle, once for all panels"""
+
+        axes = self.axes_list[panel]
+        if isinstance(periods, int):
+            periods, total_distances = (), ()
+        heights = [round(float(y), 1) for y in total_distances]
+        positions = range(len(heights))
+        # font sizes shrink with the number of bars, as they did
+        # for lookbacks of one to six months of weekly bars
+        density = len(heights) / 4.35
+        bar = self.bars[panel]
+        if bar is not None and len(bar) == len(heights):
+            for patch, height in zip(bar, heights):
+                patch.set_height(height)
+        else:
+            if bar is not None:
+                bar.remove()
+            self.bars[panel] = axes.bar(positions, heights,
+                                        color=color, alpha=0.8)
+        # annotate labels in one pass, only every 'step'-th bar is
+        # labelled when there are too many bars to read them all
+        step = ceil(len(heights) / self.max_labels) or 1
+        for annotation in self.annotations[panel]:
+            annotation.remove()
+        labelled = BarContainer(self.bars[panel].patches[::step],
+                                datavalues=heights[::step],
+                                orientation="vertical")
+        if labels is not None:
+            labels = list(labels)[::step]
+        self.annotations[panel] = axes.bar_label(
+            labelled,
+            labels=labels,
+            fmt="%d" if integer else "%2.1f",
+            padding=2,
+            size=14 - int(min(density, 6.9) / 2.0),
+            color="k",
+            weight="bold",
+            rotation_mode="anchor",
+            rotation=45,
+        )
+        plt.setp(self.annotations[panel], ha="left")
+        # limits are set once, with headroom for the annotations
+        top = max(heights, default=0.0)
+        if integer:
+            axes.set_ylim(0.0, top + max(1.65, 0.35 * top))
+        else:
+            axes.set_ylim(0.0, top + max(32.0, 0.6 * top))
+        # x-axis limits and ticks are shared between panels
+        axes.set_xlim(-0.45, max(len(heights), 1) - 0.55)
+        axes.set_xticks(positions[::step], periods[::step])
+        plt.setp(
+            self.axes_list[-1].get_xticklabels(),
+            ha="right",
+            rotation_mode="anchor",
+            rotation=45,
+            fontsize=13 - int(min(density, 6.9) / 4.0),
+        )
+        plt.setp(axes.get_yticklabels(),
+                 fontsize=13 - int(min(density, 6.9) / 3.0))
+        self.figure.canvas.draw_idle()
+
+    def draw_period_charts(self, resolution, periods, distances,
+                           counts, average_speed):
+        """Draws distance, mean speed and number of sessions per
+        period on the first three panels"""
+
+        x_label, per, adjective = self.resolution_labels[resolution]
+        self.set_labels(x_label, "Distance per " + per, panel=0)
+        self.draw_bar_chart(periods, distances, "dodgerblue", panel=0)
+        self.set_labels(x_label, adjective + " mean speed", panel=1)
+        self.draw_bar_chart(periods, average_speed, "limegreen", panel=1)
+        self.set_labels(x_label, "Number of sessions per " + per, panel=2)
+        self.draw_bar_chart(periods, counts, "gold", integer=True, panel=2)
+
+    def draw_training_load(self, resolution, periods, acute, chronic,
+                           ratio, panel=3):
+        """Draws the 7-day load as bars annotated with the acute:chronic
+        workload ratio, and the 28-day weekly mean load as a line"""
+
+        x_label, per, _ = self.resolution_labels[resolution]
+        self.set_labels(x_label, "Training load per " + per +
+                        " (labels: acute:chronic ratio)", panel=panel)
+        if isinstance(periods, int):
+            periods, acute, chronic, ratio = (), (), (), ()
+        self.draw_bar_chart(periods, acute, "tomato", panel=panel,
+                            labels=["%.2f" % r if r else "" for r in ratio])
+        axes = self.axes_list[panel]
+        line = self.lines[panel]
+        if line is None:
+            line, = axes.plot(range(len(chronic)), chronic, color="k",
+                              linewidth=2, marker="o", markersize=4)
+            self.lines[panel] = line
+            axes.legend([self.bars[panel], line],
+                        ["7-day load", "28-day weekly mean"],
+                        fontsize=12, loc="upper left", ncol=2,
+                        edgecolor="k")
+        else:
+            line.set_data(range(len(chronic)), chronic)
+        # the line may rise above the bars
+        top = max(list(acute) + list(chronic), default=0.0)
+        axes.set_ylim(0.0, top + max(32.0, 0.6 * top))
+
+    def draw_stacked_bar_chart(self, days_of_week, weekly_distances):
+        # color map
+        cmap = plt.get_cmap("jet")
+        truncated_cmap = truncate_colormap(cmap, 0.3, 0.8)
+        color_list = list(
+            ([truncated_cmap(a) for a in linspace(0, 1, len(days_of_week))])
+        )
+        # weeks by days of week, each day is stacked on the
+        # cumulative distance of the days before it
+        distances = asarray(weekly_distances, dtype=float)
+        weeks = arange(len(distances))
+        bottoms = cumsum(distances, axis=1) - distances
+        totals = distances.sum(axis=1)
+        # one bar call per day of week, days without a run
+        # are left out of the labels
+        for dow in range(len(days_of_week)):
+            bar_plot = self.axes.bar(
+                weeks,
+                distances[:, dow],
+                align="center",
+                bottom=bottoms[:, dow],
+                color=color_list[dow],
+                width=0.75,
+                alpha=0.8,
+                label=days_of_week[dow],
+            )
+            run_days = flatnonzero(distances[:, dow])
+            self.axes.bar_label(
+                BarContainer([bar_plot.patches[i] for i in run_days],
+                             datavalues=distances[run_days, dow],
+                             orientation="vertical"),
+                fmt="%.1f",
+                label_type="center",
+            )
+        # weekly totals on top of the last bar of each week
+        self.axes.bar_label(
+            bar_plot,
+            labels=["{0:.1f}".format(total) for total in totals],
+            padding=3,
+            size=13,
+            weight="bold",
+            color="k",
+        )
+        # plot legend
+        self.axes.legend(fontsize=13, loc="upper left", edgecolor="k")
+        # 5% plot padding in each direction
+        self.axes.margins(0.05)
+        # fixing x-axis tick labels with matplotlib.ticker "FixedLocator"
+        # https://stackoverflow.com/questions/63723514/userwarning-fixedformatter-should-only-be-used-together-with-fixedlocator
+        x_ticks_loc = range(len(weekly_distances))
+        x_ticks_labels = ["Week " + str(w) for w in
+                          range(1, len(weekly_distances) + 1)]
+        self.axes.xaxis.set_major_locator(ticker.FixedLocator(x_ticks_loc))
+        # Create offset transform by 0.1 points in y direction
+        # https://stackoverflow.com/questions/28615887/how-to-move-a-tick-label-in-matplotlib
+        offset = ScaledTranslation(0, 0.1, self.figure.dpi_scale_trans)
+        # apply offset transform to all x ticklabels.
+        for label in self.axes.xaxis.get_majorticklabels():
+            label.set_transform(label.get_transform() - offset)
+        self.axes.set_xticklabels(
+            ["{}".format(x) for x in x_ticks_labels],
+            rotation_mode="anchor",
+            rotation=45,
+            ha="right",
+            va="center",
+            fontsize=13,
+        )
+        # y-axis tick frequency and label
+        longest_week = totals.max() + 4
+        # kept for the overlay of the distance actually run
+        self.week_labels, self.longest_week = x_ticks_labels, longest_week
+        # y_ticks_labels = range(int(longest_week))
+        self.axes.yaxis.set_major_locator(ticker.MaxNLocator(nbins='auto'))
+        self.axes.set_ylim([0, longest_week])
+        # self.axes.yaxis.set_ticks(y_ticks_labels)
+        # self.axes.yaxis.set_ticklabels(y_ticks_labels, minor=True,
+        #                                fontsize=13)
+        # grid style: dotted
+        self.axes.grid(linestyle=":")
+        self.figure.canvas.draw_idle()
+
+    def draw_plan_actuals(self, weekly_actual, weekly_adherence):
+        """Overlays the distance actually run each week of a scheduled
+        marathon program on its stacked bar chart, with the adherence
+        (actual over planned distance) next to the week numbers. The
+        overlay is updated in place when redrawn"""
+
+        weeks = arange(len(weekly_actual))
+        bar = self.bars[0]
+        if bar is not None and len(bar) == len(weekly_actual):
+            for patch, height in zip(bar, weekly_actual):
+                patch.set_height(height)
+        else:
+            if bar is not None:
+                bar.remove()
+            self.bars[0] = self.axes.bar(weeks, weekly_actual, width=0.3,
+                                         fill=False, edgecolor="k",
+                                         hatch="//", linewidth=1.5,
+                                         label="Actual")
+            self.axes.legend(fontsize=13, loc="upper left", edgecolor="k")
+        self.axes.xaxis.set_major_formatter(ticker.FixedFormatter(
+            [label if adherence is None else
+             "{} ({:.0%})".format(label, adherence)
+             for label, adherence in zip(self.week_labels,
+                                         weekly_adherence)]))
+        self.axes.set_ylim([0, max(self.longest_week,
+                                   max(weekly_actual, default=0) + 4)])
+        self.figure.canvas.draw_idle()
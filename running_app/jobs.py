@@ -0,0 +1,148 @@
+'''
+Background jobs for the long operations of the application. Jobs run
+on a thread pool, report their progress through a queue drained on the
+Tk thread by an after() loop, and can be cancelled. Jobs writing to the
+database run one at a time, each on its own connection.
+'''
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    '''Raised inside a job by Job.report() once the job is cancelled'''
+
+
+class Job:
+    '''A job submitted to the scheduler, handed to the job function to
+    report its progress'''
+
+    def __init__(self, scheduler, name, writer, on_done, on_error):
+        self.scheduler = scheduler
+        self.name = name
+        self.writer = writer
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def report(self, message, fraction=None):
+        '''Queues a progress message, 'fraction' is the part of the work
+        done when known. Called between steps of the job, where stopping
+        is safe, so it raises JobCancelled once the job is cancelled'''
+
+        if self.cancelled.is_set():
+            raise JobCancelled(self.name)
+        self.scheduler.messages.put((self, 'progress', (message, fraction)))
+
+    def cancel(self):
+        '''Asks the job to stop at its next report, a job still waiting
+        for a worker or for the writer lock doesn't start at all'''
+
+        self.cancelled.set()
+
+
+class JobScheduler:
+    '''Runs named jobs on a thread pool, a writer lock lets a single
+    job write to the database at a time'''
+
+    def __init__(self, widget, on_progress, workers=4, poll=100):
+        '''Constructor for JobScheduler
+
+        arguments:
+            widget - Tk widget whose after() loop drains the messages
+            on_progress - called on the Tk thread with a job, a message
+                          and the fraction of the work done or None
+            workers - number of worker threads
+            poll - interval in ms between drains while jobs run
+        '''
+        self.widget = widget
+        self.on_progress = on_progress
+        self.poll = poll
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='job')
+        self.writer_lock = threading.Lock()
+        self.messages = queue.Queue()
+        # jobs submitted and not finished yet, by name
+        self.jobs = {}
+        self.draining = False
+
+    def submit(self, name, function, *args, writer=False,
+               on_done=None, on_error=None):
+        '''Runs function(job, *args) on a worker thread. on_done(result)
+        or on_error(exception) is called on the Tk thread when the job
+        ends, with a JobCancelled exception for a cancelled job. A writer
+        job waits for the writer jobs submitted before it'''
+
+        if name in self.jobs:
+            raise ValueError(f'Job already running: {name}')
+        job = Job(self, name, writer, on_done, on_error)
+        self.jobs[name] = job
+        job.future = self.executor.submit(self._run, job, function, args)
+        if not self.draining:
+            self.draining = True
+            self.widget.after(self.poll, self.drain)
+        return job
+
+    def _run(self, job, function, args):
+        '''Runs a job on a worker thread, queuing how it ended'''
+
+        lock = self.writer_lock if job.writer else None
+        try:
+            if lock:
+                lock.acquire()
+            if job.cancelled.is_set():
+                raise JobCancelled(job.name)
+            result = function(job, *args)
+        except Exception as e:
+            self.messages.put((job, 'error', e))
+        else:
+            self.messages.put((job, 'done', result))
+        finally:
+            if lock:
+                lock.release()
+
+    def drain(self):
+        '''Passes the queued messages on to the callbacks, on the Tk
+        thread, for as long as jobs are running. A callback raising
+        doesn't stop the loop, the messages left are passed on at the
+        next drain'''
+
+        try:
+            while True:
+                try:
+                    job, kind, value = self.messages.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'progress':
+                    self.on_progress(job, *value)
+                    continue
+                del self.jobs[job.name]
+                if kind == 'error' and job.on_error:
+                    job.on_error(value)
+                elif kind == 'done' and job.on_done:
+                    job.on_done(value)
+        finally:
+            if self.jobs or not self.messages.empty():
+                self.widget.after(self.poll, self.drain)
+            else:
+                self.draining = False
+
+    def writing(self):
+        '''Names of the writer jobs submitted and not finished yet'''
+
+        return [name for name, job in self.jobs.items() if job.writer]
+
+    def cancel(self, name=None):
+        '''Cancels a job by name, or every job'''
+
+        for job_name, job in self.jobs.items():
+            if name is None or job_name == name:
+                job.cancel()
+
+    def shutdown(self):
+        '''Cancels every job and waits for the running ones to stop'''
+
+        self.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -1,8 +1,18 @@
 import sqlite3
 import csv
 import os
+import gzip
+import bz2
+import lzma
 import json
-from datetime import timedelta
+import hashlib
+import sys
+import math
+from array import array
+import numpy as np
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, timedelta
 from .constants import FieldTypes as FT
 from tkinter import messagebox
 
@@ -18,7 +28,7 @@ class SQLModel:
         'Speed': {'req': True, 'type': FT.string},
         'Location': {'req': True, 'type': FT.string},
         'Period': {'req': True, 'type': FT.string_list,
-                   'values': ['1', '3', '6']},
+                   'values': ['1', '3', '6', '12', '24', '60', '120', 'All']},
         # data fields for search form
         'Search date': {'req': True, 'type': FT.iso_date_list},
         'Search duration': {'req': True, 'type': FT.iso_duration_string},
@@ -37,6 +47,8 @@ class SQLModel:
         'Fri': {'req': True, 'type': FT.decimal},
         'Sat': {'req': True, 'type': FT.decimal},
         'Sun': {'req': True, 'type': FT.decimal},
+        # first day of a marathon program
+        'Plan start': {'req': True, 'type': FT.iso_date_string},
     }
 
     # create running table if not existing
@@ -61,9 +73,182 @@ class SQLModel:
                               'Location=:Location '
                               'WHERE Date=:Date')
 
+    # insert or update running sessions in bulk
+    running_upsert_command = ('INSERT INTO running VALUES (:Date, '
+                              ':Duration, :Distance, :Pace, :Speed, '
+                              ':Location) ON CONFLICT(Date) DO UPDATE SET '
+                              'Duration=excluded.Duration, '
+                              'Distance=excluded.Distance, '
+                              'Pace=excluded.Pace, '
+                              'Speed=excluded.Speed, '
+                              'Location=excluded.Location')
+
+    # columns of the running table, in order
+    record_columns = ('Date', 'Duration', 'Distance', 'Pace', 'Speed',
+                      'Location')
+
+    # indexes serving the record list sorts, ties in date order. 'Date'
+    # is the primary key, 'Pace' is sorted on speed, 'Duration' is
+    # zero-padded so its text order is its time order
+    sort_columns = ('Date', 'Duration', 'Distance', 'Speed', 'Location')
+    create_sort_index_command = ('CREATE INDEX IF NOT EXISTS running_{0} '
+                                 'ON running ({0}, Date)')
+
+    # content compared between records of the same date on merge imports
+    content_columns = ('Duration', 'Distance', 'Pace', 'Speed', 'Location')
+
     # delete running record
     running_delete_command = ('DELETE FROM running WHERE Date=:Date')
 
+    # create trackpoint table if not existing, the per-second samples
+    # of a run are packed into one BLOB per channel, one row per date
+    create_trackpoint_table_command = ('CREATE TABLE IF NOT EXISTS '
+                                       'trackpoints '
+                                       '(Date DATE PRIMARY KEY, '
+                                       'Samples INTEGER NOT NULL, '
+                                       'Offsets BLOB NOT NULL, '
+                                       'Distances BLOB NOT NULL, '
+                                       'Elevations BLOB NOT NULL, '
+                                       'Heart_Rates BLOB NOT NULL)')
+
+    # insert or replace trackpoints of a running session
+    trackpoint_insert_command = ('INSERT OR REPLACE INTO trackpoints '
+                                 'VALUES (:Date, :Samples, :Offsets, '
+                                 ':Distances, :Elevations, :Heart_Rates)')
+
+    # delete trackpoints of a running session
+    trackpoint_delete_command = ('DELETE FROM trackpoints WHERE Date=:Date')
+
+    # array typecodes of the trackpoint channels: time offsets (s) and
+    # cumulative distances (km) as doubles, elevations (m) and heart
+    # rates (bpm) as single precision floats, 24 bytes per sample
+    trackpoint_typecodes = {'Offsets': 'd', 'Distances': 'd',
+                            'Elevations': 'f', 'Heart_Rates': 'f'}
+
+    # create import bookkeeping table if not existing, one row
+    # per imported file content
+    create_import_table_command = ('CREATE TABLE IF NOT EXISTS imports '
+                                   '(File_Hash TEXT PRIMARY KEY, '
+                                   'Filename TEXT NOT NULL, '
+                                   'Byte_Offset INTEGER NOT NULL, '
+                                   'Batch INTEGER NOT NULL, '
+                                   'Rows INTEGER NOT NULL, '
+                                   'Complete INTEGER NOT NULL)')
+
+    # save progress of an import
+    import_checkpoint_command = ('INSERT OR REPLACE INTO imports VALUES '
+                                 '(:File_Hash, :Filename, :Byte_Offset, '
+                                 ':Batch, :Rows, :Complete)')
+
+    # create training load table if not existing, one row per day
+    # with a run in the chronic window: daily distance, 7-day (acute)
+    # and 28-day (chronic) distance, acute:chronic workload ratio of
+    # weekly means, monotony and strain of the last 7 days
+    create_training_load_table_command = ('CREATE TABLE IF NOT EXISTS '
+                                          'training_load '
+                                          '(Date DATE PRIMARY KEY, '
+                                          'Distance REAL NOT NULL, '
+                                          'Acute REAL NOT NULL, '
+                                          'Chronic REAL NOT NULL, '
+                                          'ACWR REAL, '
+                                          'Monotony REAL, '
+                                          'Strain REAL)')
+
+    # recompute the training load of the days between :Lo and :Hi,
+    # rolling sums over a dense calendar starting a chronic window
+    # earlier, so every window of the range is complete
+    training_load_insert_command = (
+        "WITH RECURSIVE days(Day) AS ("
+        "VALUES(DATE(:Lo, '-27 days')) "
+        "UNION ALL "
+        "SELECT DATE(Day, '+1 day') FROM days WHERE Day < :Hi), "
+        "daily AS (SELECT Day, COALESCE(Distance, 0) AS Distance "
+        "FROM days LEFT JOIN running ON running.Date = days.Day), "
+        "rolling AS (SELECT Day, Distance, "
+        "SUM(Distance) OVER acute AS Acute, "
+        "SUM(Distance*Distance) OVER acute AS Squares, "
+        "SUM(Distance) OVER chronic AS Chronic FROM daily "
+        "WINDOW acute AS (ORDER BY Day ROWS 6 PRECEDING), "
+        "chronic AS (ORDER BY Day ROWS 27 PRECEDING)), "
+        "spread AS (SELECT *, SQRT(MAX(Squares/7 - (Acute/7)*(Acute/7), "
+        "0)) AS Deviation FROM rolling) "
+        "INSERT INTO training_load "
+        "SELECT Day, Distance, Acute, Chronic, "
+        "CASE WHEN Chronic > 0 THEN Acute/(Chronic/4) END, "
+        "CASE WHEN Deviation > 1e-6 THEN (Acute/7)/Deviation END, "
+        "CASE WHEN Deviation > 1e-6 THEN Acute*(Acute/7)/Deviation END "
+        "FROM spread WHERE Day BETWEEN :Lo AND :Hi AND Chronic > 0")
+
+    # delete the training load of the days between :Lo and :Hi
+    training_load_delete_command = ('DELETE FROM training_load '
+                                    'WHERE Date BETWEEN :Lo AND :Hi')
+
+    # days after a run whose training load depends on it
+    chronic_days = 28
+
+    # create personal bests table if not existing, one row per
+    # category with the date and value of the best
+    create_personal_bests_table_command = ('CREATE TABLE IF NOT EXISTS '
+                                           'personal_bests '
+                                           '(Category TEXT PRIMARY KEY, '
+                                           'Date DATE NOT NULL, '
+                                           'Value REAL NOT NULL)')
+
+    # insert or replace the best of a category
+    personal_best_insert_command = ('INSERT OR REPLACE INTO personal_bests '
+                                    'VALUES (:Category, :Date, :Value)')
+
+    # duration of a record in seconds, 'Duration' is zero-padded
+    duration_seconds = ("ROUND((JULIANDAY(Duration) - "
+                        "JULIANDAY('00:00:00'))*86400)")
+
+    # personal bests set by a single record: value maximized over the
+    # records matching a condition, speed for the pace brackets
+    personal_best_records = {
+        'Pace under 5 km': ('Speed', 'Distance < 5'),
+        'Pace 5-10 km': ('Speed', 'Distance >= 5 AND Distance < 10'),
+        'Pace 10 km-half marathon': ('Speed', 'Distance >= 10 AND '
+                                              'Distance < 21.0975'),
+        'Pace half marathon-marathon': ('Speed', 'Distance >= 21.0975 AND '
+                                                 'Distance < 42.195'),
+        'Pace marathon and over': ('Speed', 'Distance >= 42.195'),
+        'Longest distance': ('Distance', '1'),
+        'Longest duration': (duration_seconds, '1'),
+    }
+
+    # personal bests of total distance over a chart resolution
+    personal_best_periods = {'Best week': 'week', 'Best month': 'month'}
+
+    # create aggregation cube table if not existing: distance, number
+    # of sessions, time and sum of speeds per time grain, period (first
+    # day of the bin) and location
+    create_cube_table_command = ('CREATE TABLE IF NOT EXISTS running_cube '
+                                 '(Grain TEXT NOT NULL, '
+                                 'Period DATE NOT NULL, '
+                                 'Location TEXT NOT NULL, '
+                                 'Distance REAL NOT NULL, '
+                                 'Count INTEGER NOT NULL, '
+                                 'Seconds REAL NOT NULL, '
+                                 'Speed_Sum REAL NOT NULL, '
+                                 'PRIMARY KEY (Grain, Period, Location))')
+
+    # time grains of the cube, finest first
+    cube_grains = ('day', 'week', 'month', 'year')
+
+    # finer grain a cell drills down to, and coarser grain it rolls up
+    # to, weeks don't nest in months and are only drilled into days
+    drill_down_grains = {'year': 'month', 'month': 'day', 'week': 'day'}
+    roll_up_grains = {'day': 'month', 'month': 'year'}
+
+    # writes touching more dates than this rebuild the derived
+    # tables in one pass instead of date by date
+    bulk_write_dates = 64
+
+    # tables used by the application itself, never marathon programs
+    internal_tables = ('running', 'trackpoints', 'imports', 'training_load',
+                       'personal_bests', 'running_cube', 'plan_schedule',
+                       'stale_derived')
+
     # create program table regardless if existing or not
     create_program_table_command = ('CREATE TABLE {} '
                                     '(Mon Distance REAL, '
@@ -79,16 +264,67 @@ class SQLModel:
                               ':Tue, :Wed, :Thu, :Fri, :Sat, '
                               ':Sun)')
 
+    # create plan schedule table if not existing, the date the first
+    # week of each marathon program starts on, always a Monday
+    create_plan_schedule_table_command = ('CREATE TABLE IF NOT EXISTS '
+                                          'plan_schedule '
+                                          '(Program TEXT PRIMARY KEY, '
+                                          'Start_Date DATE NOT NULL)')
+
+    # one row while the derived tables (training load, personal bests
+    # and cube) are stale: imports write their batches without keeping
+    # them up to date and rebuild them once at the end, a database
+    # closed before that rebuild is rebuilt when opened
+    create_stale_derived_table_command = ('CREATE TABLE IF NOT EXISTS '
+                                          'stale_derived '
+                                          '(Stale INTEGER PRIMARY KEY)')
+    mark_stale_derived_command = ('INSERT OR IGNORE INTO stale_derived '
+                                  'VALUES (1)')
+
+    # days of week of the program tables, in column order
+    days_of_week = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
     # check program tables
     check_program_tables_command = ("SELECT name FROM sqlite_schema "
                                     "WHERE type='table' AND name "
                                     "NOT LIKE 'sqlite_%' AND name "
-                                    "IS NOT 'running'")
+                                    "NOT IN ({})")
+
+    # bar count the chart resolution is chosen for, lookbacks with
+    # more weeks than this are binned by month, then by year
+    target_bar_count = 30
+
+    # chart resolutions: first day of the bin containing a date,
+    # step to the next bin, bin label and mean bin length in days
+    resolutions = {
+        'day': {'floor': "DATE({})",
+                'step': '+1 day',
+                'label': "DATE({})",
+                'days': 1},
+        'week': {'floor': "DATE({}, 'weekday 0', '-6 days')",
+                 'step': '+7 days',
+                 'label': "DATE({}, '+6 days')",
+                 'days': 7},
+        'month': {'floor': "DATE({}, 'start of month')",
+                  'step': '+1 month',
+                  'label': "STRFTIME('%Y-%m', {})",
+                  'days': 30.44},
+        'year': {'floor': "DATE({}, 'start of year')",
+                 'step': '+1 year',
+                 'label': "STRFTIME('%Y', {})",
+                 'days': 365.25},
+    }
 
     # create or connect to a database
     def __init__(self, database):
+        # kept to open more connections, e.g. for background searches
+        self.database = database
         self.connection = sqlite3.connect(database)
         self.connection.row_factory = sqlite3.Row
+        # incremented on every write, keys the caches of derived data
+        self.write_generation = 0
+        # math functions are optional in SQLite builds
+        self.connection.create_function('SQRT', 1, math.sqrt)
 
     def query(self, query, parameters=None):
         cursor = self.connection.cursor()
@@ -113,11 +349,64 @@ class SQLModel:
     def create_db_and_primary_table(self):
         '''Creates database and table if they don't already exist'''
         self.query(self.create_running_table_command)
+        for column in self.sort_columns[1:]:
+            self.query(self.create_sort_index_command.format(column))
+        self.query(self.create_trackpoint_table_command)
+        self.query(self.create_import_table_command)
+        self.query(self.create_training_load_table_command)
+        self.query(self.create_personal_bests_table_command)
+        self.query(self.create_cube_table_command)
+        self.query(self.create_plan_schedule_table_command)
+        self.query(self.create_stale_derived_table_command)
+        # an import stopped before rebuilding the derived tables
+        if self.derived_stale():
+            self.rebuild_derived()
+        # databases created before the derived tables
+        if not self.query('SELECT 1 FROM training_load LIMIT 1'):
+            self.rebuild_training_load()
+        if not self.query('SELECT 1 FROM personal_bests LIMIT 1'):
+            self.rebuild_personal_bests()
+        if not self.query('SELECT 1 FROM running_cube LIMIT 1'):
+            self.rebuild_cube()
 
     def get_all_records(self):
         query = ('SELECT * FROM running ORDER BY Date DESC')
         return self.query(query)
 
+    def count_records(self):
+        return self.query('SELECT COUNT(*) AS Count FROM running')[0]['Count']
+
+    def get_records_page(self, offset, limit, order_by='Date',
+                         descending=True, after=None, before=None):
+        '''Records from an offset sorted by a column, ties in date order.
+        The order is read from an index, without sorting the table.
+        Given a record of the order as 'after' (or 'before'), the page
+        starts right after it (or ends right before it) and is found by
+        seeking the index, instead of stepping over 'offset' records'''
+
+        if order_by not in self.sort_columns:
+            raise ValueError(f'Cannot sort by column: {order_by}')
+        columns = list(dict.fromkeys((order_by, 'Date')))
+        parameters = {'Limit': limit, 'Offset': offset}
+        where = ''
+        boundary = after if after is not None else before
+        if boundary is not None:
+            # a page before the boundary is read backwards from it
+            descending = descending == (after is not None)
+            keys = [f':Key{i}' for i in range(len(columns))]
+            where = 'WHERE ({}) {} ({}) '.format(
+                ', '.join(columns), '<' if descending else '>',
+                ', '.join(keys))
+            parameters.update({key[1:]: boundary[column]
+                               for key, column in zip(keys, columns)})
+            parameters['Offset'] = 0
+        direction = 'DESC' if descending else 'ASC'
+        order = [f'{column} {direction}' for column in columns]
+        query = (f"SELECT * FROM running {where}"
+                 f"ORDER BY {', '.join(order)} LIMIT :Limit OFFSET :Offset")
+        rows = self.query(query, parameters)
+        return rows[::-1] if before is not None else rows
+
     def min_max_column_values(self):
         '''Returns minimum and maximum values for a column'''
 
@@ -136,11 +425,75 @@ class SQLModel:
                                in [min_col, max_col]])
         return [v for val in col_values for v in val]
 
-    def get_record_range(self, date_min=None, date_max=None,
-                         duration_min=None, duration_max=None,
-                         distance_min=None, distance_max=None,
-                         pace_min=None, pace_max=None,
-                         speed_min=None, speed_max=None):
+    def get_record_range(self, **bounds):
+        return self.query(*self.record_range_query(**bounds))
+
+    def iter_record_range(self, chunk_size=500, **bounds):
+        '''Yields the records of get_record_range in lists of at most
+        'chunk_size' rows, so a search can be shown as it streams in'''
+
+        cursor = self.connection.execute(*self.record_range_query(**bounds))
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            cursor.close()
+
+    def record_range_query(self, **bounds):
+        '''Query and parameters of the records within the bounds,
+        newest first'''
+
+        where, parameters = self.record_range_where(**bounds)
+        return (f'SELECT * FROM running WHERE {where} ORDER BY Date DESC',
+                parameters)
+
+    def search_summary(self, **bounds):
+        '''Summary statistics of the records within the bounds: count,
+        total distance and time, mean, median and 90th percentile of
+        speed and pace, longest distance and duration. Pace is in
+        seconds per km, over the records with a distance'''
+
+        where, parameters = self.record_range_where(**bounds)
+        cursor = self.connection.execute(
+            f'SELECT Distance, Speed, {self.duration_seconds} '
+            f'FROM running WHERE {where}', parameters)
+        rows = np.array(cursor.fetchall(), dtype=float).reshape(-1, 3)
+        cursor.close()
+        distances, speeds, seconds = rows.T
+        summary = {'Count': len(rows),
+                   'Distance': round(float(distances.sum()), 2),
+                   'Seconds': int(seconds.sum())}
+        if not len(rows):
+            return summary
+        summary.update({
+            'Mean speed': float(speeds.mean()),
+            'Median speed': float(np.median(speeds)),
+            'P90 speed': float(np.percentile(speeds, 90)),
+            'Longest distance': float(distances.max()),
+            'Longest seconds': int(seconds.max())})
+        moved = distances > 0
+        paces = seconds[moved]/distances[moved]
+        if len(paces):
+            summary.update({
+                # total time over total distance, as the Pace column
+                'Mean pace': float(seconds[moved].sum() /
+                                   distances[moved].sum()),
+                'Median pace': float(np.median(paces)),
+                'P90 pace': float(np.percentile(paces, 90))})
+        return summary
+
+    def record_range_where(self, date_min=None, date_max=None,
+                           duration_min=None, duration_max=None,
+                           distance_min=None, distance_max=None,
+                           pace_min=None, pace_max=None,
+                           speed_min=None, speed_max=None):
+        '''Condition and parameters selecting the records within the
+        bounds, a missing bound defaults to the column minimum or
+        maximum'''
+
         col_params = {'date_min': date_min,
                       'date_max': date_max,
                       'duration_min': duration_min,
@@ -156,23 +509,21 @@ class SQLModel:
                                                  col_values):
             if not col_p_val:
                 col_params[col_p_key] = col_v
-        query = ('SELECT * FROM running WHERE '
-                 'Date BETWEEN :Min_Date AND :Max_Date '
+        where = ('Date BETWEEN :Min_Date AND :Max_Date '
                  'AND Duration BETWEEN :Min_Duration AND :Max_Duration '
                  'AND Distance BETWEEN :Min_Distance AND :Max_Distance '
                  'AND Pace BETWEEN :Min_Pace AND :Max_Pace '
-                 'AND Speed BETWEEN :Min_Speed AND :Max_Speed '
-                 'ORDER BY Date DESC')
-        return self.query(query, {"Min_Date": col_params['date_min'],
-                                  "Max_Date": col_params['date_max'],
-                                  "Min_Duration": col_params['duration_min'],
-                                  "Max_Duration": col_params['duration_max'],
-                                  "Min_Distance": col_params['distance_min'],
-                                  "Max_Distance": col_params['distance_max'],
-                                  "Min_Pace": col_params['pace_min'],
-                                  "Max_Pace": col_params['pace_max'],
-                                  "Min_Speed": col_params['speed_min'],
-                                  "Max_Speed": col_params['speed_max']})
+                 'AND Speed BETWEEN :Min_Speed AND :Max_Speed')
+        return where, {"Min_Date": col_params['date_min'],
+                       "Max_Date": col_params['date_max'],
+                       "Min_Duration": col_params['duration_min'],
+                       "Max_Duration": col_params['duration_max'],
+                       "Min_Distance": col_params['distance_min'],
+                       "Max_Distance": col_params['distance_max'],
+                       "Min_Pace": col_params['pace_min'],
+                       "Max_Pace": col_params['pace_max'],
+                       "Min_Speed": col_params['speed_min'],
+                       "Max_Speed": col_params['speed_max']}
 
     def get_record(self, date):
         query = ('SELECT * FROM running WHERE Date=:Date')
@@ -181,8 +532,10 @@ class SQLModel:
 
     def get_dates(self, date_lo=None, date_hi=None):
         query = ('SELECT Date FROM running WHERE Date '
-                 'BETWEEN :Min_Date AND :Max_Date')
-        result = self.query(query, {"Min_Date": date_lo, "Max_Date": date_hi})
+                 'BETWEEN :Min_Date AND :Max_Date ORDER BY Date')
+        # a missing bound leaves the range open on that side
+        result = self.query(query, {"Min_Date": date_lo or '',
+                                    "Max_Date": date_hi or '9999-12-31'})
         return [res['Date'] for res in result]
 
     def add_record(self, record):
@@ -197,40 +550,422 @@ class SQLModel:
             query = self.running_update_command
             self.last_write = 'update record'
         self.query(query, record)
+        # rows before and after the write, for the record lists
+        self.last_rows = (results or None, self.get_record(query_date))
+        self._records_changed([query_date])
+
+    def add_records(self, records, checkpoint=None, defer_derived=False):
+        '''Adds or updates records in a single transaction, the import
+        checkpoint is committed along with them so an interrupted import
+        resumes after the last committed batch. With 'defer_derived' the
+        derived tables are marked stale instead of being updated, for
+        rebuild_derived() to rebuild once after the last batch'''
+
+        with self.connection:
+            self.connection.executemany(self.running_upsert_command, records)
+            if checkpoint is not None:
+                self.connection.execute(self.import_checkpoint_command,
+                                        checkpoint)
+            if records and defer_derived:
+                self.connection.execute(self.mark_stale_derived_command)
+        if records and defer_derived:
+            self.write_generation += 1
+        elif records:
+            self._records_changed([record['Date'] for record in records])
+
+    @classmethod
+    def record_hash(cls, record):
+        '''Digest of the content of a record, numbers are normalized so
+        values read from CSV match values read from the database'''
+
+        content = tuple(float(record[col]) if col in ('Distance', 'Speed')
+                        else str(record[col]) for col in cls.content_columns)
+        return hashlib.blake2b(repr(content).encode(), digest_size=16).digest()
+
+    def record_hash_index(self):
+        '''Maps the date of every record to the digest of its content'''
+
+        cursor = self.connection.execute('SELECT * FROM running')
+        try:
+            return {row['Date']: self.record_hash(row) for row in cursor}
+        finally:
+            cursor.close()
+
+    def merge_records(self, records, index, checkpoint=None,
+                      defer_derived=False):
+        '''Writes only new and changed records, 'index' comes from
+        record_hash_index() and is updated in place. Returns the
+        number of new, changed and identical records'''
+
+        summary = {'new': 0, 'changed': 0, 'identical': 0}
+        writes, digests = [], {}
+        for record in records:
+            digest = self.record_hash(record)
+            previous = index.get(record['Date'])
+            if previous == digest:
+                summary['identical'] += 1
+                continue
+            summary['new' if previous is None else 'changed'] += 1
+            writes.append(record)
+            digests[record['Date']] = digest
+        self.add_records(writes, checkpoint, defer_derived)
+        index.update(digests)
+        return summary
+
+    def get_import(self, file_hash):
+        query = ('SELECT * FROM imports WHERE File_Hash=:File_Hash')
+        result = self.query(query, {'File_Hash': file_hash})
+        return result[0] if result else {}
+
+    def save_import(self, checkpoint):
+        self.query(self.import_checkpoint_command, checkpoint)
 
     def delete_record(self, record):
+        previous = self.get_record(record['Date'])
         # delete record information
         delete_query = self.running_delete_command
         self.query(delete_query, record)
+        self.query(self.trackpoint_delete_command, record)
+        self.last_write = 'delete record'
+        self.last_rows = (previous or None, None)
+        self._records_changed([record['Date']])
+
+    def mark_written(self):
+        '''Called after another connection, e.g. of a background job,
+        wrote to the database, invalidates the caches of derived data'''
+
+        self.write_generation += 1
+
+    def _records_changed(self, dates):
+        '''Called after every write to the running table with
+        the dates of the records written'''
+
+        dates = sorted(set(dates))
+        if len(dates) > self.bulk_write_dates:
+            self.rebuild_derived()
+            return
+        self.update_training_load(dates)
+        self.update_personal_bests(dates)
+        self.update_cube(dates)
+        self.write_generation += 1
+
+    def derived_stale(self):
+        '''Tells whether records were written without updating the
+        derived tables, e.g. by an import not finished'''
+
+        return bool(self.query('SELECT 1 FROM stale_derived'))
+
+    def rebuild_derived(self):
+        '''Rebuilds the derived tables over the full history and clears
+        their stale mark'''
+
+        self.rebuild_training_load()
+        self.rebuild_personal_bests()
+        self.rebuild_cube()
+        self.query('DELETE FROM stale_derived')
+        self.write_generation += 1
+
+    def update_training_load(self, dates):
+        '''Recomputes the training load of the days depending on the
+        records of the given dates only, the days from each date to the
+        end of its chronic window'''
+
+        dates = sorted(set(dates))
+        # overlapping or adjacent windows are merged into one range
+        ranges = []
+        for day in map(date.fromisoformat, dates):
+            end = day + timedelta(days=self.chronic_days - 1)
+            if ranges and day <= ranges[-1][1] + timedelta(days=1):
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([day, end])
+        self._write_training_load(
+            [{'Lo': lo.isoformat(), 'Hi': hi.isoformat()}
+             for lo, hi in ranges])
+
+    def rebuild_training_load(self):
+        '''Recomputes the training load over the full history'''
+
+        query = ("SELECT MIN(Date) AS Lo, DATE(MAX(Date), '+{} days') "
+                 "AS Hi FROM running").format(self.chronic_days - 1)
+        bounds = self.query(query)[0]
+        with self.connection:
+            self.connection.execute('DELETE FROM training_load')
+        if bounds['Lo'] is not None:
+            self._write_training_load([bounds])
+
+    def _write_training_load(self, ranges):
+        with self.connection:
+            for bounds in ranges:
+                self.connection.execute(self.training_load_delete_command,
+                                        bounds)
+                self.connection.execute(self.training_load_insert_command,
+                                        bounds)
+
+    def _best_query(self, category, where='1'):
+        '''Query of the best of a category over the records
+        matching 'where', the earliest best wins ties'''
+
+        if category in self.personal_best_records:
+            value, condition = self.personal_best_records[category]
+            return (f"SELECT Date, {value} AS Value FROM running "
+                    f"WHERE ({condition}) AND ({where}) "
+                    "ORDER BY Value DESC, Date LIMIT 1")
+        spec = self.resolutions[self.personal_best_periods[category]]
+        return (f"SELECT {spec['floor'].format('Date')} AS Date, "
+                "ROUND(SUM(Distance), 2) AS Value FROM running "
+                f"WHERE {where} GROUP BY 1 ORDER BY Value DESC, Date LIMIT 1")
+
+    @staticmethod
+    def _period_start(day, resolution):
+        '''First day of the bin of a resolution containing a date'''
+
+        if resolution == 'day':
+            return day
+        if resolution == 'week':
+            return day - timedelta(days=day.weekday())
+        if resolution == 'month':
+            return day.replace(day=1)
+        return day.replace(month=1, day=1)
+
+    def update_personal_bests(self, dates=None):
+        '''Compares the records of the given dates, and the weeks and
+        months containing them, with the stored personal bests. A
+        category is searched again over the full history only when the
+        date holding its best was rewritten or deleted, or when no
+        dates are given'''
+
+        if dates is not None and not dates:
+            return
+        bests = self.get_personal_bests()
+        categories = (list(self.personal_best_records) +
+                      list(self.personal_best_periods))
+        with self.connection:
+            for category in categories:
+                where, parameters, touched = '1', [], set()
+                resolution = self.personal_best_periods.get(category)
+                if dates is not None and resolution is None:
+                    touched = set(dates)
+                    where = 'Date IN ({})'.format(', '.join('?'*len(dates)))
+                    parameters = list(dates)
+                elif dates is not None:
+                    touched = {self._period_start(date.fromisoformat(day),
+                                                  resolution).isoformat()
+                               for day in dates}
+                    step = self.resolutions[resolution]['step']
+                    where = ' OR '.join(
+                        [f"(Date >= ? AND Date < DATE(?, '{step}'))"] *
+                        len(touched))
+                    parameters = [start for start in sorted(touched)
+                                  for _ in range(2)]
+                best = bests.get(category)
+                if best is not None and best['Date'] in touched:
+                    # the best may have got worse, search everything
+                    where, parameters, best = '1', [], None
+                cursor = self.connection.execute(
+                    self._best_query(category, where), parameters)
+                candidate = cursor.fetchone()
+                cursor.close()
+                if candidate is None:
+                    if where == '1':
+                        self.connection.execute(
+                            'DELETE FROM personal_bests '
+                            'WHERE Category=:Category',
+                            {'Category': category})
+                elif best is None or candidate['Value'] > best['Value'] or \
+                        (candidate['Value'] == best['Value'] and
+                         candidate['Date'] < best['Date']):
+                    self.connection.execute(
+                        self.personal_best_insert_command,
+                        {'Category': category, 'Date': candidate['Date'],
+                         'Value': candidate['Value']})
+
+    def rebuild_personal_bests(self):
+        '''Searches the best of every category over the full history'''
+
+        with self.connection:
+            self.connection.execute('DELETE FROM personal_bests')
+        self.update_personal_bests()
+
+    def get_personal_bests(self):
+        '''Best date and value per category, read from a table holding
+        one row per category whatever the size of the history'''
+
+        query = ('SELECT * FROM personal_bests')
+        return {row['Category']: {'Date': row['Date'], 'Value': row['Value']}
+                for row in self.query(query)}
+
+    def personal_best_dates(self):
+        '''Dates of the records holding a personal best'''
 
-    def group_records(self, period):
-        # group records by weekly data per year,
-        # 'start_of_week' table created using suggestion below
-        # https://stackoverflow.com/questions/9322313/how-to-group-by-week-no-and-get-start-date-and-end-date-for-the-week-number-in-s,
-        # subsequent null entries in table converted to
-        # zeros with COALESCE command in SQL.
-        query = ("WITH RECURSIVE start_of_week(date_entry) AS ("
-                 "VALUES((SELECT MIN(Date) FROM running)) "
-                 "UNION ALL "
-                 "SELECT DATE(date_entry, 'weekday 0', '+7 days') "
-                 "FROM start_of_week WHERE date_entry < DATE('now')) "
-                 "SELECT date_entry, "
-                 "COALESCE(ROUND(Weekly_Distance, 1), 0) AS Weekly_Distance, "
-                 "COALESCE(Num_Weekly_Sessions, 0) AS Num_Weekly_Sessions, "
-                 "COALESCE(ROUND(Weekly_Mean_Speed, 1), 0) AS "
-                 "Weekly_Mean_Speed FROM start_of_week AS sow "
-                 "LEFT JOIN "
-                 "(SELECT DATE(rng.Date, 'weekday 0') AS Sunday, "
-                 "SUM(rng.Distance) AS Weekly_Distance, "
-                 "COUNT(rng.Distance) AS Num_Weekly_Sessions, "
-                 "ROUND(AVG(rng.Speed), 2) AS Weekly_Mean_Speed "
-                 "FROM running AS rng "
-                 "WHERE Sunday BETWEEN DATE('now', :Period) AND "
-                 "DATE('now', 'weekday 0', '+7 days') "
-                 "GROUP BY DATE(rng.Date, 'weekday 0')) AS rr "
-                 "ON sow.date_entry = rr.Sunday "
-                 "WHERE sow.date_entry BETWEEN DATE('now', :Period) AND "
-                 "DATE('now', 'weekday 0', '+7 days')")
+        return {best['Date'] for category, best in
+                self.get_personal_bests().items()
+                if category in self.personal_best_records}
+
+    def _cube_insert_command(self, grain, where):
+        spec = self.resolutions[grain]
+        return ("INSERT INTO running_cube "
+                f"SELECT '{grain}', {spec['floor'].format('Date')}, "
+                "Location, SUM(Distance), COUNT(*), "
+                f"SUM({self.duration_seconds}), SUM(Speed) "
+                f"FROM running WHERE {where} GROUP BY 2, Location")
+
+    def update_cube(self, dates):
+        '''Recomputes the cells of the day, week, month and year
+        containing each date, for every location since the location
+        of a record may have changed'''
+
+        with self.connection:
+            for grain in self.cube_grains:
+                step = self.resolutions[grain]['step']
+                starts = {self._period_start(date.fromisoformat(day),
+                                             grain).isoformat()
+                          for day in dates}
+                for start in sorted(starts):
+                    bounds = {'Grain': grain, 'Start': start}
+                    self.connection.execute(
+                        'DELETE FROM running_cube WHERE Grain=:Grain '
+                        'AND Period=:Start', bounds)
+                    self.connection.execute(
+                        self._cube_insert_command(
+                            grain, "Date >= :Start AND "
+                                   f"Date < DATE(:Start, '{step}')"),
+                        bounds)
+
+    def rebuild_cube(self):
+        '''Aggregates the full history at every grain'''
+
+        with self.connection:
+            self.connection.execute('DELETE FROM running_cube')
+            for grain in self.cube_grains:
+                self.connection.execute(self._cube_insert_command(grain, '1'))
+
+    def cube_query(self, grain, date_lo=None, date_hi=None, locations=None,
+                   by_location=True):
+        '''Distance, number of sessions, time and mean speed per period
+        of a grain ('day', 'week', 'month' or 'year') from the cube,
+        optionally between two dates and for some locations. Locations
+        are rolled up into one total per period when 'by_location' is
+        false'''
+
+        if grain not in self.cube_grains:
+            raise ValueError(f'Unknown grain: {grain}')
+        conditions, parameters = ['Grain=?'], [grain]
+        if date_lo is not None:
+            conditions.append('Period >= ?')
+            parameters.append(date_lo)
+        if date_hi is not None:
+            conditions.append('Period <= ?')
+            parameters.append(date_hi)
+        if locations:
+            conditions.append('Location IN ({})'.format(
+                ', '.join('?'*len(locations))))
+            parameters.extend(locations)
+        location = 'Location, ' if by_location else ''
+        query = (f"SELECT Period, {location}"
+                 "ROUND(SUM(Distance), 1) AS Distance, "
+                 "SUM(Count) AS Count, SUM(Seconds) AS Seconds, "
+                 "ROUND(SUM(Speed_Sum)/SUM(Count), 1) AS Mean_Speed "
+                 f"FROM running_cube WHERE {' AND '.join(conditions)} "
+                 f"GROUP BY Period{', Location' if by_location else ''} "
+                 f"ORDER BY Period{', Location' if by_location else ''}")
+        return self.query(query, parameters)
+
+    def drill_down(self, grain, period, locations=None, by_location=True):
+        '''Cells of the next finer grain within a period, months of a
+        year, days of a month or of a week'''
+
+        if grain not in self.drill_down_grains:
+            raise ValueError(f'Cannot drill down from grain: {grain}')
+        step = self.resolutions[grain]['step']
+        date_hi = self.query(f"SELECT DATE(?, '{step}', '-1 day') AS Hi",
+                             [period])[0]['Hi']
+        return self.cube_query(self.drill_down_grains[grain], period,
+                               date_hi, locations, by_location)
+
+    def roll_up(self, grain, period, locations=None, by_location=True):
+        '''Cell of the next coarser grain containing a period, the
+        month of a day or the year of a month'''
+
+        if grain not in self.roll_up_grains:
+            raise ValueError(f'Cannot roll up from grain: {grain}')
+        coarser = self.roll_up_grains[grain]
+        start = self._period_start(date.fromisoformat(period),
+                                   coarser).isoformat()
+        return self.cube_query(coarser, start, start, locations,
+                               by_location)
+
+    def get_training_load(self, date_lo, date_hi):
+        '''Daily training load between two dates, days without a run
+        in the chronic window have no row'''
+
+        query = ('SELECT * FROM training_load WHERE Date '
+                 'BETWEEN :Lo AND :Hi ORDER BY Date')
+        return self.query(query, {'Lo': date_lo, 'Hi': date_hi})
+
+    def lookback_days(self, period):
+        '''Number of days covered by a lookback period, either a
+        number of months or 'All' for the full history'''
+
+        if str(period) == 'All':
+            query = ("SELECT COALESCE(JULIANDAY('now') - "
+                     "JULIANDAY(MIN(Date)), 0) AS Days FROM running")
+            return self.query(query)[0]['Days']
+        return int(period)*30.44
+
+    def lookback_resolution(self, period):
+        '''Finest resolution ('week', 'month' or 'year') giving no more
+        than 'target_bar_count' bars over the lookback period'''
+
+        days = self.lookback_days(period)
+        for resolution in ('week', 'month'):
+            if days/self.resolutions[resolution]['days'] <= \
+                    self.target_bar_count:
+                return resolution
+        return 'year'
+
+    def _period_bins(self, period, spec):
+        '''Common table expression of the bins of a lookback period and
+        the first day of the first bin'''
+
+        # bins generated with a recursive common table expression
+        if str(period) == 'All':
+            start = spec['floor'].format('(SELECT MIN(Date) FROM running)')
+        else:
+            start = spec['floor'].format("DATE('now', :Period)")
+        end = spec['floor'].format("DATE('now')")
+        bins = ("WITH RECURSIVE bins(bin_start) AS ("
+                f"VALUES({start}) "
+                "UNION ALL "
+                f"SELECT DATE(bin_start, '{spec['step']}') FROM bins "
+                f"WHERE bin_start < {end})")
+        return bins, start
+
+    def group_records(self, period, resolution=None):
+        '''Distance, number of sessions and mean speed per week, month
+        or year over the lookback period, the resolution is chosen from
+        the lookback when not given'''
+
+        # subsequent null entries in table converted to zeros with
+        # COALESCE command in SQL. Only records from the first bin on
+        # are read, with a range search on the 'Date' primary key.
+        spec = self.resolutions[resolution or
+                                self.lookback_resolution(period)]
+        bins, start = self._period_bins(period, spec)
+        query = (f"{bins} "
+                 f"SELECT {spec['label'].format('bin_start')} AS Period, "
+                 "COALESCE(ROUND(Distance, 1), 0) AS Distance, "
+                 "COALESCE(Num_Sessions, 0) AS Num_Sessions, "
+                 "COALESCE(ROUND(Mean_Speed, 1), 0) AS Mean_Speed "
+                 "FROM bins LEFT JOIN "
+                 f"(SELECT {spec['floor'].format('Date')} AS Bin, "
+                 "SUM(Distance) AS Distance, "
+                 "COUNT(Distance) AS Num_Sessions, "
+                 "AVG(Speed) AS Mean_Speed "
+                 f"FROM running WHERE Date >= {start} "
+                 "GROUP BY Bin) AS rr "
+                 "ON bins.bin_start = rr.Bin "
+                 "WHERE bin_start IS NOT NULL ORDER BY bin_start")
         result = self.query(query, {"Period": '-'+str(period)+' months'})
         try:
             periods, total_distances, tot_counts, mean_speed = \
@@ -239,6 +974,31 @@ class SQLModel:
             periods, total_distances, tot_counts, mean_speed = 0, 0, 0, 0
         return periods, total_distances, tot_counts, mean_speed
 
+    def group_training_load(self, period, resolution=None):
+        '''Acute load, chronic weekly mean load and acute:chronic ratio
+        on the last day of each bin of the lookback period, or today
+        for the current bin'''
+
+        spec = self.resolutions[resolution or
+                                self.lookback_resolution(period)]
+        bins, _ = self._period_bins(period, spec)
+        query = (f"{bins} "
+                 f"SELECT {spec['label'].format('bin_start')} AS Period, "
+                 "COALESCE(ROUND(Acute, 1), 0) AS Acute, "
+                 "COALESCE(ROUND(Chronic/4, 1), 0) AS Chronic, "
+                 "COALESCE(ROUND(ACWR, 2), 0) AS ACWR "
+                 "FROM bins LEFT JOIN training_load ON training_load.Date = "
+                 f"MIN(DATE(bin_start, '{spec['step']}', '-1 day'), "
+                 "DATE('now')) "
+                 "WHERE bin_start IS NOT NULL ORDER BY bin_start")
+        result = self.query(query, {"Period": '-'+str(period)+' months'})
+        try:
+            periods, acute, chronic, ratio = \
+                zip(*[row.values() for row in result])
+        except ValueError:
+            periods, acute, chronic, ratio = 0, 0, 0, 0
+        return periods, acute, chronic, ratio
+
     def data_addition(self, data):
         '''Adds 'Pace' and 'Speed' columns and adds
         zero-padding to 'Duration' column data'''
@@ -258,6 +1018,15 @@ class SQLModel:
                                  seconds=int(duration[6:8]),
                                  microseconds=0).total_seconds()
         pace_in_secs = time_in_secs/float(distance)
+        data['Pace'] = self.pace_string(pace_in_secs)
+        # save new distances as floats
+        data['Speed'] = round(3600/pace_in_secs, 1)
+        return data
+
+    @staticmethod
+    def pace_string(pace_in_secs):
+        '''Formats seconds per kilometre as '<m>:<ss>' '''
+
         minutes, seconds = divmod(pace_in_secs, 60)
         # in case rounded seconds add up to 60 add extra minute
         # and set seconds variable to zero
@@ -265,16 +1034,188 @@ class SQLModel:
             minutes += 1
             seconds = 0
         # zero padding added for seconds
-        data['Pace'] = f'{int(minutes)}:{str(int(round(seconds, 0))).zfill(2)}'
-        # save new distances as floats
-        data['Speed'] = round(3600/pace_in_secs, 1)
-        return data
+        return f'{int(minutes)}:{str(int(round(seconds, 0))).zfill(2)}'
+
+    # race time prediction section
+    race_distances = {'5 km': 5.0, '10 km': 10.0,
+                      'Half marathon': 21.0975, 'Marathon': 42.195}
+
+    # Riegel fatigue exponent used when recent best efforts
+    # don't span enough distances to fit one
+    riegel_exponent = 1.06
+
+    # distance brackets of the best efforts the exponent is fitted on
+    best_effort_brackets = (3.0, 5.0, 10.0, 21.0975, 42.195)
+
+    def predict_race_times(self, recent_days=365):
+        '''Predicts race times over 'race_distances' with a Riegel model,
+        T2 = T1*(D2/D1)**k, from every session of the last 'recent_days'
+        before the latest session. The exponent k is fitted on the best
+        effort of each distance bracket. Returns the exponent and, per
+        race, the best predicted time in seconds and the session it was
+        predicted from'''
+
+        cursor = self.connection.execute(
+            f"SELECT Date, Distance, {self.duration_seconds} AS Seconds "
+            "FROM running WHERE Distance > 0 ORDER BY Date")
+        rows = cursor.fetchall()
+        cursor.close()
+        if not rows:
+            return self.riegel_exponent, {}
+        dates, distances, seconds = zip(*rows)
+        dates = np.array(dates, dtype='datetime64[D]')
+        distances = np.array(distances, dtype=float)
+        seconds = np.array(seconds, dtype=float)
+        # sessions of the recent window, shorter runs only when
+        # there is nothing else
+        recent = dates >= dates[-1] - np.timedelta64(recent_days, 'D')
+        basis = recent & (distances >= self.best_effort_brackets[0])
+        if not basis.any():
+            basis = recent
+        distances, seconds, dates = (distances[basis], seconds[basis],
+                                     dates[basis])
+        # fastest session of each bracket, sorted by bracket then pace
+        brackets = np.digitize(distances, self.best_effort_brackets)
+        order = np.lexsort((seconds/distances, brackets))
+        first = np.unique(brackets[order], return_index=True)[1]
+        best = order[first]
+        exponent = self.riegel_exponent
+        if len(best) > 1 and np.ptp(np.log(distances[best])) > np.log(1.5):
+            exponent = np.polyfit(np.log(distances[best]),
+                                  np.log(seconds[best]), 1)[0]
+            # outside this range the fit says more about the
+            # efforts chosen than about the runner
+            exponent = float(np.clip(exponent, 1.0, 1.2))
+        # predictions of every session for every race, one row per
+        # session, the fastest prediction of each race is kept
+        targets = np.array(list(self.race_distances.values()))
+        predicted = seconds[:, None]*(targets[None, :] /
+                                      distances[:, None])**exponent
+        fastest = predicted.argmin(axis=0)
+        return exponent, {
+            race: {'Seconds': float(predicted[session, column]),
+                   'Date': str(dates[session])}
+            for column, (race, session) in enumerate(
+                zip(self.race_distances, fastest))}
+
+    # trackpoint section, per-second samples of a running session
+    def add_trackpoints(self, date, offsets, distances,
+                        elevations, heart_rates):
+        '''Packs the sample channels of a run into BLOBs and stores them,
+        channels can be lists, arrays or NumPy arrays of equal length'''
+
+        channels = {'Offsets': offsets, 'Distances': distances,
+                    'Elevations': elevations, 'Heart_Rates': heart_rates}
+        record = {'Date': date, 'Samples': len(offsets)}
+        for name, values in channels.items():
+            packed = array(self.trackpoint_typecodes[name], values)
+            if len(packed) != record['Samples']:
+                raise ValueError(f'Channel {name} has {len(packed)} '
+                                 f'samples, expected {record["Samples"]}')
+            # BLOBs are always stored little-endian
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            record[name] = packed.tobytes()
+        self.query(self.trackpoint_insert_command, record)
+
+    def get_trackpoints(self, date):
+        '''Returns the sample channels of a run as arrays'''
+
+        query = ('SELECT * FROM trackpoints WHERE Date=:Date')
+        result = self.query(query, {'Date': date})
+        if not result:
+            return {}
+        trackpoints = {'Date': result[0]['Date']}
+        for name, typecode in self.trackpoint_typecodes.items():
+            unpacked = array(typecode)
+            unpacked.frombytes(result[0][name])
+            if sys.byteorder == 'big':
+                unpacked.byteswap()
+            trackpoints[name] = unpacked
+        return trackpoints
+
+    def delete_trackpoints(self, date):
+        self.query(self.trackpoint_delete_command, {'Date': date})
+
+    @staticmethod
+    def _time_at_distance(offsets, distances, distance, lo=0):
+        '''Linearly interpolated time offset at a cumulative distance'''
+
+        index = bisect_left(distances, distance, lo)
+        if index == 0:
+            return offsets[0]
+        if index == len(distances):
+            return offsets[-1]
+        d0, d1 = distances[index-1], distances[index]
+        t0, t1 = offsets[index-1], offsets[index]
+        if d1 == d0:
+            return t1
+        return t0 + (distance - d0)*(t1 - t0)/(d1 - d0)
+
+    def lap_splits(self, date, lap_distance=1.0):
+        '''Splits a run in laps of 'lap_distance' km, the last lap
+        holds the remainder of the distance'''
+
+        trackpoints = self.get_trackpoints(date)
+        if not trackpoints or not trackpoints['Offsets']:
+            return []
+        offsets = trackpoints['Offsets']
+        distances = trackpoints['Distances']
+        splits = []
+        lap_start, time_start = distances[0], offsets[0]
+        index = 0
+        # lap ends closer than a millimetre to the end of the run are
+        # rounding errors, the remainder goes to the lap before
+        tolerance = 1e-6
+        while distances[-1] - lap_start > tolerance:
+            # from the start of the run, rounding errors don't add up
+            lap_end = distances[0] + (len(splits) + 1)*lap_distance
+            if distances[-1] - lap_end < tolerance:
+                lap_end = distances[-1]
+            time_end = self._time_at_distance(offsets, distances,
+                                              lap_end, index)
+            index = bisect_left(distances, lap_end, index)
+            seconds = time_end - time_start
+            splits.append({'Lap': len(splits) + 1,
+                           'Distance': round(lap_end - lap_start, 3),
+                           'Seconds': round(seconds, 1),
+                           'Pace': self.pace_string(
+                               seconds/(lap_end - lap_start))})
+            lap_start, time_start = lap_end, time_end
+        return splits
+
+    def best_efforts(self, date, targets=(1, 5, 10)):
+        '''Fastest time in seconds over each target distance (km) within
+        a run, None if the run is shorter than the target'''
+
+        trackpoints = self.get_trackpoints(date)
+        efforts = dict.fromkeys(targets)
+        if not trackpoints:
+            return efforts
+        offsets = trackpoints['Offsets']
+        distances = trackpoints['Distances']
+        for target in targets:
+            start = 0
+            # sliding window over the samples: for each end sample the
+            # start sample only moves forward, one pass per target
+            for end in range(len(distances)):
+                if distances[end] - distances[0] < target:
+                    continue
+                while distances[end] - distances[start+1] >= target:
+                    start += 1
+                # interpolate the start so the window is exactly 'target'
+                elapsed = offsets[end] - self._time_at_distance(
+                    offsets, distances, distances[end] - target, start)
+                if efforts[target] is None or elapsed < efforts[target]:
+                    efforts[target] = round(elapsed, 1)
+        return efforts
 
     # marathon program data import section
     # only upon import of a new marathon program data import
     def create_program_table(self, program):
         '''Creates marathon program table if it doesn't already exist'''
         self.query(self.create_program_table_command.format(program))
+        self.write_generation += 1
 
     def get_all_program_records(self, program):
         query = ('SELECT * FROM {}'.format(program))
@@ -285,16 +1226,141 @@ class SQLModel:
     def add_program_record(self, table, record):
         query = self.insert_program_command.format(table)
         self.query(query, record)
+        self.write_generation += 1
 
     def remove_program_table(self, table):
         query = ('DROP TABLE {}'.format(table))
         self.query(query)
+        self.query('DELETE FROM plan_schedule WHERE Program=:Program',
+                   {'Program': table})
+        self.write_generation += 1
+
+    def set_plan_start(self, program, start_date):
+        '''Schedules a marathon program, its first week starts on the
+        Monday of the week of 'start_date'. Returns that Monday'''
+
+        start = self._period_start(date.fromisoformat(start_date), 'week')
+        self.query('INSERT OR REPLACE INTO plan_schedule VALUES '
+                   '(:Program, :Start_Date)',
+                   {'Program': program, 'Start_Date': start.isoformat()})
+        self.write_generation += 1
+        return start.isoformat()
+
+    def get_plan_start(self, program):
+        query = ('SELECT Start_Date FROM plan_schedule WHERE Program=:Program')
+        result = self.query(query, {'Program': program})
+        return result[0]['Start_Date'] if result else None
+
+    def plan_adherence(self, program):
+        '''Planned and actual distance of every day of a scheduled
+        marathon program, and their ratio per day and per week. Returns
+        None when the program has no start date'''
+
+        start = self.get_plan_start(program)
+        if start is None:
+            return None
+        # one pass: program rows numbered as weeks, unpivoted into
+        # days, dated from the start and joined to the runs with
+        # lookups on the 'Date' primary key
+        days = ' UNION ALL '.join(
+            f'SELECT Week, {dow}, {day} FROM plan'
+            for dow, day in enumerate(self.days_of_week))
+        query = ("WITH plan AS (SELECT ROW_NUMBER() OVER "
+                 f"(ORDER BY rowid) AS Week, * FROM {program}), "
+                 f"days(Week, Dow, Planned) AS ({days}), "
+                 "scheduled AS (SELECT Week, Dow, "
+                 "DATE(:Start, '+' || (7*(Week - 1) + Dow) || ' days') "
+                 "AS Date, "
+                 "COALESCE(Planned, 0) AS Planned FROM days) "
+                 "SELECT Week, Dow, scheduled.Date AS Date, Planned, "
+                 "COALESCE(running.Distance, 0) AS Actual, "
+                 "CASE WHEN Planned > 0 THEN "
+                 "COALESCE(running.Distance, 0)/Planned END AS Adherence "
+                 "FROM scheduled LEFT JOIN running "
+                 "ON running.Date = scheduled.Date ORDER BY Week, Dow")
+        rows = self.query(query, {'Start': start})
+        planned = np.array([row['Planned'] for row in rows]).reshape(-1, 7)
+        actual = np.array([row['Actual'] for row in rows]).reshape(-1, 7)
+        weekly_planned, weekly_actual = planned.sum(axis=1), actual.sum(axis=1)
+        weekly = [{'Week': week + 1, 'Start': rows[7*week]['Date'],
+                   'Planned': float(weekly_planned[week]),
+                   'Actual': float(weekly_actual[week]),
+                   'Adherence': (float(weekly_actual[week] /
+                                       weekly_planned[week])
+                                 if weekly_planned[week] > 0 else None)}
+                  for week in range(len(planned))]
+        return {'Start': start, 'Days': rows, 'Weeks': weekly}
 
     def check_program_tables(self):
-        results = self.query(self.check_program_tables_command)
+        query = self.check_program_tables_command.format(
+            ', '.join('?'*len(self.internal_tables)))
+        results = self.query(query, self.internal_tables)
         return [result['name'] for result in results]
 
 
+class ChartCache:
+    '''Least recently used cache of prepared chart data'''
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key, compute):
+        '''Returns the value cached for 'key', otherwise computes and
+        stores it, evicting the least recently used entry when more
+        than 'maxsize' entries are held'''
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = compute()
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+
+class DateIndex:
+    '''Sorted ISO dates, looked up by prefix with bisection for the
+    autocomplete of the search date fields'''
+
+    def __init__(self, dates):
+        self.dates = sorted(dates)
+
+    def prefix_range(self, prefix):
+        '''Index range of the dates starting with 'prefix' '''
+
+        lo = bisect_left(self.dates, prefix)
+        return lo, bisect_left(self.dates, prefix + '\uffff', lo)
+
+    def match(self, prefix):
+        '''Number of dates starting with 'prefix' and the first one'''
+
+        lo, hi = self.prefix_range(prefix)
+        return hi - lo, (self.dates[lo] if hi > lo else None)
+
+    def distinct(self, prefix, width):
+        '''Distinct leading 'width' characters of the dates starting
+        with 'prefix', skipping from one value to the next by bisection'''
+
+        lo, hi = self.prefix_range(prefix)
+        values = []
+        while lo < hi:
+            values.append(self.dates[lo][:width])
+            lo = bisect_left(self.dates, values[-1] + '\uffff', lo, hi)
+        return values
+
+    def drill_down(self, text):
+        '''Choices for the text of a date field: the years, the months
+        of the year typed or the days of the month typed'''
+
+        if len(text) >= 7:
+            return self.dates[slice(*self.prefix_range(text[:7]))]
+        elif len(text) >= 4:
+            return self.distinct(text[:4], 7)
+        return self.distinct('', 4)
+
+
 class CSVModel:
     '''CSV file retrieval and storage'''
 
@@ -327,15 +1393,50 @@ class CSVModel:
         else:
             self.filename = filename
 
+    # compressed formats, detected by magic bytes when reading
+    # and by file extension when writing
+    compression_formats = {
+        'gzip': {'magic': b'\x1f\x8b', 'extension': '.gz',
+                 'open': gzip.open},
+        'bz2': {'magic': b'BZh', 'extension': '.bz2', 'open': bz2.open},
+        'xz': {'magic': b'\xfd7zXZ\x00', 'extension': '.xz',
+               'open': lzma.open},
+    }
+
+    def compression(self, mode='r'):
+        '''Returns the compression format of the file, None if plain'''
+
+        if mode == 'r' and os.path.exists(self.filename):
+            with open(self.filename, 'rb') as fh:
+                header = fh.read(6)
+            for name, codec in self.compression_formats.items():
+                if header.startswith(codec['magic']):
+                    return name
+            return None
+        extension = os.path.splitext(self.filename)[1].lower()
+        for name, codec in self.compression_formats.items():
+            if extension == codec['extension']:
+                return name
+        return None
+
+    def _open(self, mode, encoding='utf-8'):
+        '''Opens the file in text mode, decompressing or compressing
+        transparently'''
+
+        compression = self.compression(mode)
+        if compression is None:
+            return open(self.filename, mode, encoding=encoding, newline='')
+        return self.compression_formats[compression]['open'](
+            self.filename, mode+'t', encoding=encoding, newline='')
+
     def load_records(self, fields):
         '''Reads in all records from the CSV file and returns a list'''
 
         if not os.path.exists(self.filename):
             return []
 
-        with open(self.filename, 'r', encoding='utf-8-sig') as fh:
-            # turning fh into a list is necessary for the unit tests
-            csvreader = csv.DictReader(list(fh.readlines()))
+        with self._open('r', encoding='utf-8-sig') as fh:
+            csvreader = csv.DictReader(fh)
             try:
                 missing_fields = set(fields.keys()) - set(csvreader.fieldnames)
                 if len(missing_fields) > 0:
@@ -347,10 +1448,62 @@ class CSVModel:
             except Exception:
                 pass
 
+    def content_hash(self, chunk_size=1 << 20):
+        '''SHA-256 digest of the raw file content'''
+
+        digest = hashlib.sha256()
+        with open(self.filename, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def iter_record_batches(self, fields, batch_size=1000, offset=0):
+        '''Yields batches of records along with the byte offset, in the
+        decompressed stream, past the last record of each batch.
+        Reading starts from 'offset' when resuming an import'''
+
+        compression = self.compression()
+        if compression is None:
+            fh = open(self.filename, 'rb')
+        else:
+            fh = self.compression_formats[compression]['open'](
+                self.filename, 'rb')
+        with fh:
+            position = 0
+
+            # the csv reader pulls lines only until a record ends, quoted
+            # fields spanning several lines included, so the bytes read
+            # so far end with the last record read
+            def lines():
+                nonlocal position
+                for line in fh:
+                    position += len(line)
+                    yield line.decode('utf-8')
+
+            rows = lines()
+            fieldnames = next(csv.reader(rows), [])
+            if fieldnames:
+                fieldnames[0] = fieldnames[0].lstrip('\ufeff')
+            missing_fields = set(fields.keys()) - set(fieldnames)
+            if len(missing_fields) > 0:
+                raise ValueError(f'File is missing fields: '
+                                 f'{", ".join(sorted(missing_fields))}')
+            if offset:
+                fh.seek(offset)
+                position = offset
+            batch = []
+            for record in csv.DictReader(rows, fieldnames):
+                batch.append(record)
+                if len(batch) == batch_size:
+                    yield batch, position
+                    batch = []
+            if batch:
+                yield batch, position
+
     def save_records(self, rows, keys):
         '''Save a dictionary of data to a CSV file'''
 
-        with open(self.filename, 'w') as fh:
+        with self._open('w') as fh:
             csvwriter = csv.DictWriter(fh, fieldnames=keys)
             csvwriter.writeheader()
             for row in rows:
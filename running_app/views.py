@@ -2,7 +2,8 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 from . import widgets as w
-from re import split
+from . import charts as c
+from datetime import date
 
 
 class MainMenu(tk.Menu):
@@ -33,6 +34,10 @@ class MainMenu(tk.Menu):
                  label='Export file with running data'+chr(8230),
                  command=self.callbacks['file->export']
                  )
+        self.file_menu.add_command(
+                 label='Cancel running jobs',
+                 command=self.callbacks['file->cancel_jobs']
+                 )
         self.file_menu.add_separator()
         self.file_menu.add_command(
                  # 8230: ASCII value for horizontal ellipsis
@@ -45,6 +50,15 @@ class MainMenu(tk.Menu):
                 self.add_program_menu(table)
         self.add_cascade(label='File', menu=self.file_menu)
 
+        # the records menu
+        records_menu = tk.Menu(self, tearoff=False)
+        records_menu.add_command(
+                 # 8230: ASCII value for horizontal ellipsis
+                 label='Personal bests'+chr(8230),
+                 command=self.callbacks['on_show_personal_bests']
+                 )
+        self.add_cascade(label='Records', menu=records_menu)
+
         # the help menu
         help_menu = tk.Menu(self, tearoff=False)
         help_menu.add_command(label='About'+chr(8230), command=self.show_about)
@@ -216,7 +230,8 @@ class DataRecordForm(tk.Frame):
 class DataInteractionForm(tk.Frame):
     '''The selection form for our bar chart'''
 
-    def __init__(self, parent, fields, callbacks, api_data, *args, **kwargs):
+    def __init__(self, parent, fields, callbacks, api_data,
+                 race_distances=(), *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.callbacks = callbacks
         self.api_data = api_data
@@ -306,12 +321,44 @@ class DataInteractionForm(tk.Frame):
         self.sys_sunset.grid(row=1, column=4, padx=2, pady=5, sticky=tk.W)
         weatherpanel.grid(row=1, column=0, sticky=('NSEW'))
 
+        # race time prediction panel
+        predictionpanel = tk.LabelFrame(self, text='Race predictions',
+                                        padx=5, pady=5, fg='black',
+                                        bg='#ECECEC')
+        self.predictions = {}
+        for column, race in enumerate(race_distances):
+            self.predictions[race] = ttk.Label(predictionpanel,
+                                               text=race + ': -',
+                                               foreground='black',)
+            self.predictions[race].grid(row=0, column=column, padx=2,
+                                        pady=4, sticky=tk.W)
+        self.prediction_basis = ttk.Label(predictionpanel, text='',
+                                          foreground='black',)
+        self.prediction_basis.grid(row=1, column=0, columnspan=4, padx=2,
+                                   pady=5, sticky=tk.W)
+        predictionpanel.grid(row=2, column=0, sticky=('NSEW'))
+
+    def set_predictions(self, exponent, predictions):
+        '''Shows predicted race times, in seconds per race'''
+
+        for race, label in self.predictions.items():
+            if race in predictions:
+                minutes, seconds = divmod(
+                    round(predictions[race]['Seconds']), 60)
+                hours, minutes = divmod(minutes, 60)
+                label.config(text=f'{race}: {hours}:{minutes:02}:{seconds:02}')
+            else:
+                label.config(text=race + ': -')
+        self.prediction_basis.config(
+            text=f'Riegel exponent {exponent:.3f}, fitted on the best '
+                 'efforts of the last year' if predictions else '')
+
 
 class SearchForm(tk.Frame):
     '''Selection form for advanced search, shows output in treeview'''
 
     def __init__(self, parent, fields, callbacks,
-                 valid_dates, *args, **kwargs):
+                 date_index, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.callbacks = callbacks
 
@@ -325,18 +372,18 @@ class SearchForm(tk.Frame):
         # advanced selection form
         advancedselectioninfo = tk.LabelFrame(self, text='Advanced selection',
                                               padx=5, pady=5, fg='black', bg='#ECECEC')
-        min_date_var = tk.StringVar(value=valid_dates[0])
-        max_date_var = tk.StringVar(value=valid_dates[-1])
+        min_date_var = tk.StringVar(value=date_index.dates[0])
+        max_date_var = tk.StringVar(value=date_index.dates[-1])
         self.search_inputs['date_min'] = w.LabelInput(
             advancedselectioninfo, 'Date: min',
             field_spec=fields['Search date'],
             label_args={'foreground': 'black'},
             input_args={'width': 13,
-                        'values': valid_dates,
+                        'date_index': date_index,
                         'max_var': max_date_var,
                         'focus_update_var':
                         min_date_var})
-        self.search_inputs['date_min'].set(valid_dates[0])
+        self.search_inputs['date_min'].set(date_index.dates[0])
         self.search_inputs['date_min'].grid(row=0, column=0,
                                             padx=8, pady=(20, 0),
                                             sticky=(tk.W + tk.E))
@@ -345,11 +392,11 @@ class SearchForm(tk.Frame):
             field_spec=fields['Search date'],
             label_args={'foreground': 'black'},
             input_args={'width': 13,
-                        'values': valid_dates,
+                        'date_index': date_index,
                         'min_var': min_date_var,
                         'focus_update_var': max_date_var,
                         'style': 'TCombobox'},)
-        self.search_inputs['date_max'].set(valid_dates[-1])
+        self.search_inputs['date_max'].set(date_index.dates[-1])
         self.search_inputs['date_max'].grid(row=1, column=0, padx=8,
                                             sticky=(tk.W + tk.E))
         self.search_inputs['duration_min'] = w.LabelInput(
@@ -433,6 +480,14 @@ class SearchForm(tk.Frame):
                                 padx=8, pady=(5, 0))
         advancedselectioninfo.grid(row=0, column=0, sticky='EW')
 
+        # live search: every change of a bound asks for a new search,
+        # the application waits for the typing to pause before running it
+        for widget in self.search_inputs.values():
+            widget.variable.trace('w', self.on_change)
+
+    def on_change(self, *args):
+        self.callbacks['on_search_changed']()
+
     def get(self):
         '''Retrieve data from Tkinter and place it in regular Python objects'''
 
@@ -461,7 +516,8 @@ class RecordList(tk.Frame):
         'Date': {'label': 'Date (YYYY-mm-dd)', 'width': 120},
         'Duration': {'label': 'Duration (hh:mm:ss)', 'width': 120},
         'Distance': {'label': 'Distance (km)'},
-        'Pace': {'label': 'Pace (min/km)'},
+        # pace is sorted on speed, in the opposite order
+        'Pace': {'label': 'Pace (min/km)', 'sort': 'Speed', 'reverse': True},
         'Speed': {'label': 'Speed (km/hr)'},
         'Location': {'label': 'Location (City, Country)', 'width': 154},
     }
@@ -470,12 +526,17 @@ class RecordList(tk.Frame):
     default_anchor = tk.W
 
     def __init__(self, parent, callbacks,
-                 inserted, updated,
+                 edited, personal_bests=None,
                  *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.callbacks = callbacks
-        self.inserted = inserted
-        self.updated = updated
+        # row tags of the records written this session, by date,
+        # a dict shared with the application and kept up to date by it
+        self.edited = edited
+        # dates of the records holding a personal best, a set
+        # shared with the application and kept up to date by it
+        self.personal_bests = (set() if personal_bests is None
+                               else personal_bests)
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
 
@@ -499,13 +560,33 @@ class RecordList(tk.Frame):
         # hide first column
         self.treeview.config(show='headings')
 
-        # configure scrollbar for the treeview
+        # the treeview only holds the rows in view, the scrollbar
+        # spans all the rows and moves the window over them
         self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL,
-                                       command=self.treeview.yview)
-        self.treeview.configure(yscrollcommand=self.scrollbar.set)
+                                       command=self.on_scroll)
         self.treeview.grid(row=0, column=0, sticky='NSEW')
         self.scrollbar.grid(row=0, column=1, sticky='NSEW')
 
+        # row source: number of rows and a function returning the rows
+        # from an offset, sorted by a column. Rows around the window are
+        # kept in a block, so small scrolls don't fetch again
+        self.count, self.fetch = 0, None
+        self.sort_heading, self.heading_descending = 'Date', True
+        self.sort_column, self.sort_descending = 'Date', True
+        self.show_sort_heading()
+        self.top = 0
+        self.visible = int(self.treeview.cget('height'))
+        self.block_start, self.block = 0, []
+        # values and tag of the items in view, by date
+        self.shown = {}
+        # date of the selected record, and of the record last opened
+        self.selected, self.opened = None, None
+        self.treeview.bind('<Configure>', self.on_resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.treeview.bind(sequence, self.on_mousewheel)
+        for sequence in ('<Up>', '<Down>', '<Prior>', '<Next>'):
+            self.treeview.bind(sequence, self.on_key)
+
         # configure treeview columns
         for name, definition in self.column_defs.items():
             label = definition.get('label', '')
@@ -514,12 +595,18 @@ class RecordList(tk.Frame):
             width = definition.get('width', self.default_width)
             stretch = definition.get('stretch', False)
             self.treeview.heading(name, text=label, anchor=anchor)
+            if name != '#0':
+                # bind on header selection
+                self.treeview.heading(
+                    name,
+                    command=lambda column=name: self.on_sort_records(column))
             self.treeview.column(name, anchor=anchor, minwidth=minwidth,
                                  width=width, stretch=stretch)
 
         # configure row tags
         self.treeview.tag_configure('inserted_record', background='lightgreen')
         self.treeview.tag_configure('updated_record', background='deepskyblue')
+        self.treeview.tag_configure('personal_best', background='gold')
 
         # bind on row selection
         self.treeview.bind('<<TreeviewSelect>>', self.on_open_record)
@@ -527,67 +614,269 @@ class RecordList(tk.Frame):
     def on_open_record(self, *args):
         try:
             selected_id = self.treeview.selection()[0]
-            self.callbacks['on_open_record'](selected_id.split('|')[0])
+            self.selected = selected_id
+            # reselecting a row after a scroll doesn't open it again
+            if selected_id != self.opened:
+                self.opened = selected_id
+                self.callbacks['on_open_record'](selected_id)
         # quick fix when window loses focus and no line is selected,
         # a better fix is to find a way to keep the line selected
         except IndexError:
             pass
 
-        # bind on header selection
-        self.reverse_sort = tk.BooleanVar()
-        self.reverse_sort.set(False)
-        self.treeview.bind('<Button-1>', self.on_sort_records)
-
-    def on_sort_records(self, event):
-        '''Sorts treeview list by column header name.
-        https://stackoverflow.com/questions/22032152/\
-            python-ttk-treeview-sort-numbers'''
-
-        region = self.treeview.identify_region(event.x, event.y)
-        column = self.treeview.identify_column(event.x)
-        if region == 'heading':
-            itemlist = list((self.treeview.set(x, column), x) for x in
-                            self.treeview.get_children(''))
-            if column in ('#3', '#5'):
-                itemlist.sort(key=lambda x: float(x[0]),
-                              reverse=self.reverse_sort.get())
+    def on_sort_records(self, column):
+        '''Sorts the records by column header name, clicking the same
+        header again reverses the order. The rows in view are fetched
+        again from the source, sorted by the database'''
+
+        if column == self.sort_heading:
+            self.heading_descending = not self.heading_descending
+        else:
+            self.sort_heading, self.heading_descending = column, False
+        definition = self.column_defs[column]
+        self.sort_column = definition.get('sort', column)
+        self.sort_descending = (self.heading_descending !=
+                                definition.get('reverse', False))
+        self.show_sort_heading()
+        self.top = 0
+        self.refresh()
+
+    def show_sort_heading(self):
+        '''Marks the sorted column header with the sort direction'''
+
+        for name, definition in list(self.column_defs.items())[1:]:
+            label = definition.get('label', '')
+            if name == self.sort_heading:
+                # 9660 and 9650: down and up pointing triangles
+                label += ' ' + chr(9660 if self.heading_descending else 9650)
+            self.treeview.heading(name, text=label)
+
+    def on_scroll(self, *args):
+        '''Scrollbar command, moves the window to a fraction of the
+        rows or by a number of rows or pages'''
+
+        if args[0] == 'moveto':
+            self.scroll_to(round(float(args[1])*self.count))
+        elif args[0] == 'scroll':
+            step = self.visible if args[2] == 'pages' else 1
+            self.scroll_to(self.top + int(args[1])*step)
+
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+        return 'break'
+
+    def on_key(self, event):
+        '''Moves the selection with the arrow and page keys, scrolling
+        the window when the selection leaves it'''
+
+        steps = {'Up': -1, 'Down': 1,
+                 'Prior': -self.visible, 'Next': self.visible}
+        items = self.treeview.get_children()
+        if not items:
+            return 'break'
+        if self.selected in items:
+            index = self.top + items.index(self.selected)
+        else:
+            index = self.top
+        index = min(max(index + steps[event.keysym], 0), self.count - 1)
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible:
+            self.scroll_to(index - self.visible + 1)
+        iid = self.treeview.get_children()[index - self.top]
+        self.treeview.selection_set(iid)
+        self.treeview.focus(iid)
+        return 'break'
+
+    def on_resize(self, event):
+        '''Fits the number of rows held to the height of the treeview'''
+
+        items = self.treeview.get_children()
+        bbox = self.treeview.bbox(items[0]) if items else None
+        if bbox:
+            visible = max(1, (event.height - bbox[1]) // bbox[3])
+            if visible != self.visible:
+                self.visible = visible
+                self.scroll_to(self.top, force=True)
+
+    def scroll_to(self, top, force=False):
+        top = min(max(top, 0), max(self.count - self.visible, 0))
+        if top != self.top or force:
+            self.top = top
+            self.draw_window()
+
+    def window_rows(self):
+        '''Rows in view, fetched from the source with a margin of one
+        window on each side when they aren't in the block already.
+        When the new block overlaps or touches the block held, its rows
+        are kept and the missing ones are read from the boundary row,
+        by seeking instead of counting from the first row'''
+
+        end = min(self.top + self.visible, self.count)
+        block_end = self.block_start + len(self.block)
+        if not (self.block_start <= self.top and end <= block_end):
+            start, size = max(self.top - self.visible, 0), 3*self.visible
+            sort = (self.sort_column, self.sort_descending)
+            if self.block and self.block_start < start <= block_end:
+                kept = self.block[start - self.block_start:]
+                block = kept + self.fetch(block_end, size - len(kept),
+                                          *sort, after=self.block[-1])
+            elif self.block and start < self.block_start <= start + size:
+                kept = self.block[:start + size - self.block_start]
+                block = self.fetch(start, self.block_start - start,
+                                   *sort, before=self.block[0]) + kept
             else:
-                itemlist.sort(key=lambda x: x, reverse=self.reverse_sort.get())
-            for index, (_, iid) in enumerate(itemlist):
-                self.treeview.move(iid, self.treeview.parent(iid), index)
-        # https://stackoverflow.com/questions/17168046/python-how-to-negate-value-if-true-return-false-if-false-return-true
-        self.reverse_sort.set(not (False | self.reverse_sort.get()))
-
-    def populate(self, rows):
-        '''Clear the treeview and write the supplied data rows to it'''
-
-        for row in self.treeview.get_children():
-            self.treeview.delete(row)
-
+                block = self.fetch(start, size, *sort)
+            self.block_start, self.block = start, block
+        return self.block[self.top - self.block_start:end - self.block_start]
+
+    def row_tag(self, rowdata):
+        if rowdata['Date'] in self.edited:
+            return self.edited[rowdata['Date']]
+        elif rowdata['Date'] in self.personal_bests:
+            return 'personal_best'
+        return ''
+
+    def draw_window(self):
+        '''Brings the items of the treeview in line with the rows in
+        view: items of rows out of view are deleted, new rows inserted
+        at their index and changed rows updated'''
+
+        rows = self.window_rows() if self.fetch is not None else []
         valuekeys = list(self.column_defs.keys())[1:]
-        for rowdata in rows:
-            rowkey = (str(rowdata['Date']), str(rowdata['Duration']),
-                      str(rowdata['Distance']), str(rowdata['Pace']),
-                      str(rowdata['Speed']), str(rowdata['Location']))
-            values = [rowdata[key] for key in valuekeys]
-            if self.inserted and rowkey in self.inserted:
-                tag = 'inserted_record'
-            elif self.updated and rowkey in self.updated:
-                tag = 'updated_record'
+        window = {rowdata['Date']: rowdata for rowdata in rows}
+        gone = [iid for iid in self.shown if iid not in window]
+        if gone:
+            self.treeview.delete(*gone)
+        shown = {}
+        for index, rowdata in enumerate(rows):
+            iid = rowdata['Date']
+            item = ([rowdata[key] for key in valuekeys],
+                    self.row_tag(rowdata))
+            if iid not in self.shown:
+                self.treeview.insert('', index, iid=iid, text=iid,
+                                     values=item[0], tag=item[1])
             else:
-                tag = ''
-            stringkey = '{}|{}|{}|{}|{}|{}'.format(*rowkey)
-            self.treeview.insert('', 'end', iid=stringkey, text=stringkey,
-                                 values=values, tag=tag)
+                if self.treeview.index(iid) != index:
+                    self.treeview.move(iid, '', index)
+                if self.shown[iid] != item:
+                    self.treeview.item(iid, values=item[0], tags=item[1])
+            shown[iid] = item
+        self.shown = shown
+        if self.selected is not None and self.selected in shown:
+            self.treeview.selection_set(self.selected)
+            self.treeview.focus(self.selected)
+        if self.count:
+            self.scrollbar.set(self.top/self.count,
+                               min((self.top + self.visible)/self.count, 1))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def sorts_before(self, row, other):
+        key, other_key = ((row[self.sort_column], row['Date']),
+                          (other[self.sort_column], other['Date']))
+        return key > other_key if self.sort_descending else key < other_key
+
+    def remove_row(self, rowdata):
+        '''Takes a row out of the block, or shifts the block and the
+        window when the row was before them'''
+
+        self.count -= 1
+        dates = [row['Date'] for row in self.block]
+        if rowdata['Date'] in dates:
+            index = dates.index(rowdata['Date'])
+            del self.block[index]
+            if self.block_start + index < self.top:
+                self.top -= 1
+        elif self.block and self.sorts_before(rowdata, self.block[0]):
+            self.block_start -= 1
+            self.top -= 1
+
+    def add_row(self, rowdata):
+        '''Puts a row into the block at its sorted position, or shifts
+        the block and the window when the row goes before them. Rows in
+        view stay in view'''
+
+        self.count += 1
+        index = 0
+        while index < len(self.block) and \
+                self.sorts_before(self.block[index], rowdata):
+            index += 1
+        if index == 0 and self.block_start > 0:
+            self.block_start += 1
+            self.top += 1
+        elif index < len(self.block) or \
+                self.block_start + len(self.block) == self.count - 1:
+            self.block.insert(index, rowdata)
+            if self.block_start + index < self.top:
+                self.top += 1
+
+    def apply_change(self, before, after):
+        '''Applies one write reported by the model, 'before' and
+        'after' are the rows before and after it, None when the
+        record didn't or doesn't exist'''
+
+        if before is not None:
+            self.remove_row(before)
+        if after is not None:
+            self.add_row(after)
+            self.selected = self.opened = after['Date']
+        self.scroll_to(self.top, force=True)
+
+    def refresh(self):
+        '''Fetches the rows in view again, after a write or a sort'''
+
+        self.block_start, self.block = 0, []
+        self.scroll_to(self.top, force=True)
+
+    def set_source(self, count, fetch, focus=True):
+        '''Shows 'count' rows, fetch(offset, limit, column, descending)
+        returns the rows from an offset sorted by a column. The row just
+        before or after the rows wanted is passed as 'before' or 'after'
+        when known, so the source can seek from it. With 'focus' the
+        list takes the keyboard focus and selects the first row'''
+
+        self.count, self.fetch = count, fetch
+        self.top, self.selected, self.opened = 0, None, None
+        self.refresh()
 
         # selects automatically the first row, to make
         # selections keyboard-friendly
-        if len(rows) > 0:
-            firstrow = self.treeview.identify_row(0)
+        if focus and count > 0:
+            firstrow = self.treeview.get_children()[0]
             self.treeview.focus_set()
             self.treeview.selection_set(firstrow)
             self.treeview.focus(firstrow)
 
+    def populate(self, rows, focus=True):
+        '''Shows a list of rows sorted by date, newest first, sorted
+        again in memory on header clicks. Without 'focus' the keyboard
+        focus and the selection are left alone, e.g. for results shown
+        while search bounds are typed'''
+
+        self.rows = list(rows)
+        self.sorted_rows = {('Date', True): self.rows}
+        self.set_source(len(self.rows), self.fetch_rows, focus)
+
+    def extend(self, rows):
+        '''Appends rows older than those shown, as a search streams in'''
+
+        self.rows.extend(rows)
+        self.sorted_rows = {('Date', True): self.rows}
+        self.count = len(self.rows)
+        self.refresh()
+
+    def fetch_rows(self, offset, limit, column, descending, **boundary):
+        # rows in memory are sliced at the offset, boundary rows unused
+        if (column, descending) not in self.sorted_rows:
+            self.sorted_rows[column, descending] = sorted(
+                self.rows, key=lambda row: (row[column], row['Date']),
+                reverse=descending)
+        return self.sorted_rows[column, descending][offset:offset + limit]
+
 
 class DeleteTableForm(tk.Frame):
     '''Widget input form for deleting marathon program'''
@@ -622,54 +911,110 @@ class DeleteTableForm(tk.Frame):
 
 
 class BarChartView(tk.Frame):
-    def __init__(self, parent, fields, selection=1, *args, **kwargs):
+    figsize = (11, 12)
+
+    def __init__(self, parent, fields, training_load, resolution,
+                 generation, cache, selection=1, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.fields = fields
-
-        # bar chart plots
+        self.training_load = training_load
+        self.resolution = resolution
+        self.generation = generation
+        self.cache = cache
+        # cache key of the data currently drawn
+        self.drawn_key = None
+
+        # bar chart plots on one figure sharing the x-axis,
+        # created once and redrawn in place
         plotinfo = tk.LabelFrame(self, text='Bar charts', padx=5, pady=5)
-        distance_chart = w.BarChartWidget(self, "Weeks", "Distance (km)",
-                                          "Distance per week")
-        distance_chart.grid(row=0, column=0, sticky=(tk.W + tk.E))
-        speed_chart = w.BarChartWidget(self, "Weeks", "Mean speed (km/h)",
-                                       "Weekly mean speed")
-        speed_chart.grid(row=1, column=0, sticky=(tk.W + tk.E))
-        count_chart = w.BarChartWidget(self, "Weeks", "Number of sessions",
-                                       "Number of sessions per week")
-        count_chart.grid(row=2, column=0, sticky=(tk.W + tk.E))
-
-        periods, distances, counts, average_speed = \
-            self.fields(period=selection)
-        distance_chart.draw_bar_chart(periods, distances,
-                                      selection, 'dodgerblue')
-        speed_chart.draw_bar_chart(periods, average_speed,
-                                   selection, 'limegreen')
-        count_chart.draw_bar_chart(periods, counts, selection,
-                                   'gold', integer=True)
+        self.charts = w.BarChartWidget(self, ["Weeks"] * 4,
+                                       ["Distance (km)",
+                                        "Mean speed (km/h)",
+                                        "Number of sessions",
+                                        "Load (km)"],
+                                       ["Distance per week",
+                                        "Weekly mean speed",
+                                        "Number of sessions per week",
+                                        "Training load per week"],
+                                       figsize=self.figsize, panels=4)
+        self.charts.grid(row=0, column=0, sticky=(tk.W + tk.E))
+        self.refresh(selection)
         plotinfo.grid(row=0, column=0, sticky=(tk.W + tk.E))
 
+    def refresh(self, selection):
+        '''Redraws the bar charts over a lookback period on the existing
+        figure and canvas'''
+
+        # the resolution follows from the lookback period,
+        # so the number of bars stays about the same
+        resolution = self.resolution(selection)
+        # grouped data is cached until the next write, nothing is
+        # redrawn when the charts already show it. Lookbacks are
+        # relative to today, so is the cache key
+        key = (self.generation(), str(selection), resolution,
+               self.figsize, date.today())
+        if key == self.drawn_key:
+            return
+        grouped, load = self.cache.get(
+            key, lambda: (self.fields(period=selection,
+                                      resolution=resolution),
+                          self.training_load(period=selection,
+                                             resolution=resolution)))
+        self.drawn_key = key
+        self.charts.draw_period_charts(resolution, *grouped)
+        self.charts.draw_training_load(resolution, *load)
+
 
 class StackedBarChartView(tk.Frame):
     def __init__(self, parent, table_name,
                  days_of_week, weekly_distances,
+                 fields=None, callbacks=None, start_date=None,
                  *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.table_name = table_name
         self.days_of_week = days_of_week
         self.weekly_distances = weekly_distances
-
-        # stacked bar chart title
-        title_name = ' '.join(split(r'[\-_+.]', self.table_name))
+        self.callbacks = callbacks
 
         # bar chart plots
         plotinfo = tk.LabelFrame(self, text='Marathon program', padx=5, pady=5)
-        distance_chart = w.BarChartWidget(self, "Week number",
-                                          "Weekly distances (km)",
-                                          "Weekly progression for " +
-                                          title_name +
-                                          " marathon training program",
-                                          figsize=(15, 11))
-        distance_chart.grid(row=0, column=0, sticky=(tk.W + tk.E))
-        distance_chart.draw_stacked_bar_chart(self.days_of_week,
-                                              self.weekly_distances)
+        self.distance_chart = w.BarChartWidget(self, "Week number",
+                                               "Weekly distances (km)",
+                                               c.plan_title(self.table_name),
+                                               figsize=(15, 11))
+        self.distance_chart.grid(row=0, column=0, sticky=(tk.W + tk.E))
+        self.distance_chart.draw_stacked_bar_chart(self.days_of_week,
+                                                   self.weekly_distances)
         plotinfo.grid(row=0, column=0, sticky=(tk.W + tk.E))
+
+        # program schedule, the distance actually run is
+        # overlaid once the program has a start date
+        if callbacks is not None:
+            scheduleinfo = tk.LabelFrame(self, text='Program schedule',
+                                         padx=5, pady=5)
+            self.start_val = w.LabelInput(scheduleinfo,
+                                          'Start date (YYYY-mm-dd)',
+                                          field_spec=fields['Plan start'],
+                                          input_args={'width': 12})
+            self.start_val.set(start_date or '')
+            self.start_val.grid(row=0, column=0)
+            self.startbutton = w.LabelInput(
+                scheduleinfo, 'Compare with runs',
+                input_class=ttk.Button,
+                input_var=self.on_set_start)
+            self.startbutton.grid(row=0, column=1, padx=8, pady=(16, 0))
+            scheduleinfo.grid(row=1, column=0, sticky=tk.W)
+
+    def on_set_start(self):
+        adherence = self.callbacks['on_set_plan_start'](
+            self.table_name, self.start_val.get())
+        if adherence is not None:
+            self.draw_adherence(adherence)
+
+    def draw_adherence(self, adherence):
+        '''Overlays the weekly distance run from 'plan_adherence()' '''
+
+        self.start_val.set(adherence['Start'])
+        self.distance_chart.draw_plan_actuals(
+            [week['Actual'] for week in adherence['Weeks']],
+            [week['Adherence'] for week in adherence['Weeks']])
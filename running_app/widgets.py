@@ -3,30 +3,10 @@ from tkinter import ttk
 from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 from .constants import FieldTypes as FT
-from numpy import linspace, zeros
+from . import charts as c
 
 # matplotlib
-from matplotlib.figure import Figure
-from matplotlib import ticker
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.transforms import ScaledTranslation
-from matplotlib import use as mpl_use, pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
-
-# Supported values for backend are ['GTK3Agg', 'GTK3Cairo',
-# 'GTK4Agg', 'GTK4Cairo', 'MacOSX',
-# 'nbAgg', 'QtAgg', 'QtCairo', 'Qt5Agg', 'Qt5Cairo', 'TkAgg',
-# 'TkCairo', 'WebAgg', 'WX', 'WXAgg', 'WXCairo', 'agg', 'cairo',
-# 'pdf', 'pgf', 'ps', 'svg', 'template']
-mpl_use("TkAgg")
-# To list all available styles, use: print(plt.style.available)
-# https://matplotlib.org/stable/tutorials/introductory/customizing.html
-plt.style.use("fivethirtyeight")
-# silences warning: INFO matplotlib.category: Using categorical units
-# to plot a list of strings that are all parsable as floats or dates.
-# If these strings should be plotted as numbers, cast to the appropriate
-# data type before plotting.
-plt.set_loglevel("WARNING")
 
 
 class ValidatedMixin:
@@ -399,14 +379,20 @@ class SearchFormDurationEntry(ValidatedMixin, ttk.Entry):
 
 
 class SearchFormDateEntry(ValidatedMixin, ttk.Combobox):
-    """Validate dates and check if initial date is lower than final date"""
+    """Validate dates and check if initial date is lower than final date,
+    dates are completed and listed from a sorted date index"""
 
     def __init__(
         self, *args, min_var=None, max_var=None,
-        focus_update_var=None, **kwargs
+        focus_update_var=None, date_index=None, **kwargs
     ):
         super().__init__(*args, **kwargs)
 
+        # the drop-down list is filled when opened, drilling down
+        # from the years to the months and days of the typed date
+        self.date_index = date_index
+        self.configure(postcommand=self._drill_down)
+
         # there should always be a variable else some of our code will fail
         self.variable = kwargs.get("textvariable") or tk.StringVar
 
@@ -455,23 +441,29 @@ class SearchFormDateEntry(ValidatedMixin, ttk.Combobox):
             self.set("")
             return True
 
-        # get our value list
-        values = self.cget("values")
-        # do a case-insensitive match against the entered text
-        matching = [x for x in values if
-                    x.lower().startswith(proposed.lower())]
-        if len(matching) == 0:
+        # match the entered text against the dates by bisection
+        count, first = self.date_index.match(proposed)
+        if count == 0:
             valid = False
-        elif len(matching) == 1:
-            self.set(matching[0])
+        elif count == 1:
+            self.set(first)
             self.icursor(tk.END)
             valid = False
         return valid
 
+    def _drill_down(self):
+        self.configure(values=self.date_index.drill_down(self.get()))
+
     def _focusout_validate(self, **kwargs):
         valid = True
         value = self.get()
 
+        # a year or month picked from the drop-down list isn't a date
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            self.error.set(f"Not a date: {value}")
+            return False
         try:
             min_val = datetime.strptime(self.min_var.get(), "%Y-%m-%d")
             if datetime.strptime(value, "%Y-%m-%d") < min_val:
@@ -584,157 +576,31 @@ class LabelInput(tk.Frame):
 
 
 class BarChartWidget(tk.Frame):
-    """Graphical plots showing some statistics on running"""
+    """Graphical plots showing some statistics on running, the
+    figure is drawn by charts.BarChartFigure on a Tk canvas"""
 
     def __init__(
-        self, parent, x_label, y_label, title, figsize=(11, 3), *args, **kwargs
+        self, parent, x_label, y_label, title, figsize=(11, 3), panels=1,
+        *args, **kwargs
     ):
         super().__init__(parent, *args, **kwargs)
-        self.figure = Figure(figsize=figsize, dpi=60,
-                             tight_layout={"rect": (0.01, 0.0, 1.0, 1.01)}
-                             )
+        self.chart = c.BarChartFigure(x_label, y_label, title,
+                                      figsize=figsize, panels=panels)
+        self.figure = self.chart.figure
         self.canvas = FigureCanvasTkAgg(self.figure, master=self)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
-        # axes
-        self.axes = self.figure.add_subplot(1, 1, 1)
-        self.axes.set_xlabel(x_label, fontsize=15)
-        self.axes.set_ylabel(y_label, fontsize=15)
-        self.axes.set_title(title, fontsize=17)
-
-    def draw_bar_chart(self, periods, total_distances, selection,
-                       color, integer=False):
-        self.bar = self.axes.bar(
-            periods, total_distances, color=color, label=periods, alpha=0.8
-        )
-        self.axes.set_xlim(
-            float(self.axes.xaxis.get_data_interval()[0]) - 0.05,
-            float(self.axes.xaxis.get_data_interval()[1]) + 0.05,
-        )
-        # annotate labels
-        if not isinstance(total_distances, int):
-            total_distances = [round(float(x), 1) for x in total_distances]
-            for x, y in zip(periods, total_distances):
-                if not integer:
-                    self.axes.annotate(
-                        "{0:2.1f}".format(y),
-                        xy=(x, y + y / 8.0),
-                        ha="left",
-                        size=14 - int(int(selection) / 2.0),
-                        color="k",
-                        weight="bold",
-                        rotation_mode="anchor",
-                        rotation=45,
-                    )
-                    self.axes.set_ylim(
-                        float(self.axes.yaxis.get_data_interval()[0]),
-                        float(self.axes.yaxis.get_data_interval()[1]) + 32.0,
-                    )
-
-                else:
-                    self.axes.annotate(
-                        "{0}".format(int(y)),
-                        xy=(x, y + y / 8.0),
-                        ha="left",
-                        size=14 - int(int(selection) / 2.0),
-                        color="k",
-                        weight="bold",
-                        rotation_mode="anchor",
-                        rotation=45,
-                    )
-                    self.axes.set_ylim(
-                        float(self.axes.yaxis.get_data_interval()[0]),
-                        float(self.axes.yaxis.get_data_interval()[1]) + 1.65,
-                    )
-
-        plt.setp(
-            self.axes.get_xticklabels(),
-            ha="right",
-            rotation_mode="anchor",
-            rotation=45,
-            fontsize=13 - int(int(selection) / 4.0),
-        )
-        plt.setp(self.axes.get_yticklabels(),
-                 fontsize=13 - int(int(selection) / 3.0))
-        self.canvas.flush_events()
-
-    def _truncate_colormap(self, cmap, minval=0.0, maxval=1.0, n=100):
-        new_cmap = LinearSegmentedColormap.from_list(
-            "trunc({n},{a:.2f},{b:.2f})".format(n=cmap.name,
-                                                a=minval, b=maxval),
-            cmap(linspace(minval, maxval, n)),
-        )
-        return new_cmap
+
+    def draw_bar_chart(self, *args, **kwargs):
+        self.chart.draw_bar_chart(*args, **kwargs)
+
+    def draw_period_charts(self, *args, **kwargs):
+        self.chart.draw_period_charts(*args, **kwargs)
+
+    def draw_training_load(self, *args, **kwargs):
+        self.chart.draw_training_load(*args, **kwargs)
 
     def draw_stacked_bar_chart(self, days_of_week, weekly_distances):
-        # color map
-        cmap = plt.get_cmap("jet")
-        truncated_cmap = self._truncate_colormap(cmap, 0.3, 0.8)
-        color_list = list(
-            ([truncated_cmap(a) for a in linspace(0, 1, len(days_of_week))])
-        )
-        bottom = zeros(len(weekly_distances),)
-        for w_index, week in enumerate(weekly_distances):
-            for dow, day in enumerate(week):
-                bar_plot = self.axes.bar(
-                    w_index,
-                    day,
-                    align="center",
-                    bottom=bottom[w_index],
-                    color=color_list[dow],
-                    width=0.75,
-                    alpha=0.8,
-                )
-                bottom[w_index] += day
-                bl = bar_plot[0].get_xy()
-                x = 0.5 * bar_plot[0].get_width() + bl[0]
-                y = 0.5 * bar_plot[0].get_height() + bl[1]
-                if day != 0.0:
-                    self.axes.text(x, y, "{0:.1f}".format(day),
-                                   ha="center", va="top")
-            self.axes.text(
-                x,
-                sum(week) + 0.5,
-                "{0:.1f}".format(sum(week)),
-                ha="center",
-                va="bottom",
-                size=13,
-                weight="bold",
-                color="k",
-            )
-        # plot legend
-        self.axes.legend(days_of_week, fontsize=13,
-                         loc="upper left",
-                         edgecolor="k")
-        # 5% plot padding in each direction
-        self.axes.margins(0.05)
-        # fixing x-axis tick labels with matplotlib.ticker "FixedLocator"
-        # https://stackoverflow.com/questions/63723514/userwarning-fixedformatter-should-only-be-used-together-with-fixedlocator
-        x_ticks_loc = range(len(weekly_distances))
-        x_ticks_labels = ["Week " + str(w) for w in
-                          range(1, len(weekly_distances) + 1)]
-        self.axes.xaxis.set_major_locator(ticker.FixedLocator(x_ticks_loc))
-        # Create offset transform by 0.1 points in y direction
-        # https://stackoverflow.com/questions/28615887/how-to-move-a-tick-label-in-matplotlib
-        offset = ScaledTranslation(0, 0.1, self.figure.dpi_scale_trans)
-        # apply offset transform to all x ticklabels.
-        for label in self.axes.xaxis.get_majorticklabels():
-            label.set_transform(label.get_transform() - offset)
-        self.axes.set_xticklabels(
-            ["{}".format(x) for x in x_ticks_labels],
-            rotation_mode="anchor",
-            rotation=45,
-            ha="right",
-            va="center",
-            fontsize=13,
-        )
-        # y-axis tick frequency and label
-        longest_week = max([sum(week) for week in weekly_distances]) + 4
-        # y_ticks_labels = range(int(longest_week))
-        self.axes.yaxis.set_major_locator(ticker.MaxNLocator(nbins='auto'))
-        self.axes.set_ylim([0, longest_week])
-        # self.axes.yaxis.set_ticks(y_ticks_labels)
-        # self.axes.yaxis.set_ticklabels(y_ticks_labels, minor=True,
-        #                                fontsize=13)
-        # grid style: dotted
-        self.axes.grid(linestyle=":")
-        self.canvas.flush_events()
+        self.chart.draw_stacked_bar_chart(days_of_week, weekly_distances)
+
+    def draw_plan_actuals(self, weekly_actual, weekly_adherence):
+        self.chart.draw_plan_actuals(weekly_actual, weekly_adherence)